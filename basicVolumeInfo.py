@@ -21,25 +21,62 @@ r"""
 """
 
 
-from typing import (List, Generator, Dict, Optional, Any, Callable as Function,
-                    Type)
+from typing import (List, Dict, Optional, Any, Type, Tuple, Iterable, Iterator,
+                    TextIO, Union)
 from subprocess import Popen, PIPE
-from contextlib import contextmanager
-from functools import wraps
+from datetime import datetime, timezone
+from itertools import islice
+from bisect import bisect_right
+from heapq import nlargest
+from array import array
+from concurrent.futures import Executor, ProcessPoolExecutor
+from uuid import uuid4
+from time import perf_counter, process_time
 from collections import OrderedDict
-from datetime import datetime
+from collections.abc import Mapping
 
 import re
 import argparse
 import os
 import sys
 import subprocess
+import struct
+import asyncio
+import signal
+import tempfile
+import threading
+import mmap
+import cProfile
+import pstats
+import json
+import csv
+import sqlite3
+import socketserver
 
 
-newlines = re.compile(r'\n+')
-
 agentMountpoint = '/home/agents/'
 
+agentDataset = 'homePool/home/agents'
+
+cacheDirectory = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+    'basicVolumeInfo'
+)
+
+# Fill dates `forecast` projects past this are as good as never (and past what
+# `time` can print).
+forecastHorizon = int(datetime(9999, 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+# Usage logging; see `scriptLog`.
+logURL = os.environ.get('BASICVOLUMEINFO_LOG_URL') \
+    or 'https://supportfiles.datto.com/api/script/log'
+
+deviceIDPath = '/datto/config/deviceID'
+
+# Usage logs kept for later while they can't be submitted.
+logSpoolSize = 64
+
 
 def infoPath(uuid: str, snap: str) -> str:
     return agentMountpoint + uuid + '/.zfs/snapshot/' + snap + '/' + uuid \
@@ -56,95 +93,271 @@ def time(epoch: int, utc: bool =True) -> str:
         return datetime.fromtimestamp(epoch).strftime('%m-%d-%Y %H:%M')
 
 
-@contextmanager
-def getIO(command: str) -> Generator[List[str], None, None]:
+def parseTime(text: str, utc: bool =True, now: Optional[float] =None) -> int:
     """
-    Get results from terminal commands as lists of lines of text.
+    Convert a point in time to Linux epoch time. Takes epoch times, dates like
+    `2018-12-29`, `2018-12-29 13:30` or `12-29-2018 13:30` (as printed; UTC
+    unless `utc` is False), or ages like `12h` or `7d` (before `now`).
     """
-    with Popen(command, shell=True, stdout=PIPE, stderr=PIPE) as proc:
-        stdout, stderr = proc.communicate()
+    text = text.strip()
 
-    if stderr:
-        raise ValueError('Command exited with errors: {}'.format(stderr))
+    if text.isdigit():
+        return int(text)
 
-    if stdout:
-        stdout = re.split(newlines, stdout.decode())
+    age = re.fullmatch(r'([0-9]+)([smhdw])', text)
+    if age:
+        seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+        return int((now if now is not None else datetime.now().timestamp())
+                   - int(age.group(1)) * seconds[age.group(2)])
 
-        # For some reason, `shell=True` likes to yield an empty string.
-        if stdout[-1] == '':
-            stdout = stdout[:-1]
+    for form in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                 '%m-%d-%Y %H:%M', '%m-%d-%Y'):
+        try:
+            moment = datetime.strptime(text, form)
+        except ValueError:
+            continue
+        if utc:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return int(moment.timestamp())
 
-    yield stdout
+    raise ValueError('Unrecognized time \'{}\''.format(text))
 
 
-def rmElements(it: Dict, els: List, rev: bool =False) -> Dict:
+def newest(items: List[Any], last: int) -> List[Any]:
     """
-    Filter one container by another. If `rev` is set to True, then the logic is
-    reversed.
+    The `last` items of `items`; all of them if there are fewer, none if
+    `last` is 0.
     """
-    retIt = {}  # type: Dict
+    return items[max(0, len(items) - last):] if last > 0 else []
 
-    if rev:
-        for el in it:
-            if el in els:
-                retIt = {**retIt, el: it[el]}
-    else:
-        for el in it:
-            if el not in els:
-                retIt = {**retIt, el: it[el]}
-
-    return retIt
-
-
-def rmElementsDec(els: List, rev: bool =False, level: int =0) -> Function:
-    """
-    Apply `rmElements` to a function, the first argument being its return value.
-
-    Level applies to depth at which to apply the filter. Could be generalized
-    for true depth-independent/flattened filtering, without losing structure.
-    """
-    def _decor(fn: Function[..., Dict[str, int]]) -> Function[[Dict], Dict[str, int]]:
-        @wraps(fn)
-        def _fn(arg: Dict) -> Dict[str, int]:
-            res = fn(arg)
-
-            def traverse(subDict: Dict, currentDepth: int =0) -> Optional[Dict]:
-                """
-                Traverse nested dictionaries to the necessary level before
-                filtering by `els`.
-                """
-                if currentDepth == level:
-                    if level == 0:
-                        # Cover base-case filtering.
-                        nonlocal res
-                        res = rmElements(subDict, els=els, rev=rev)
-                        return None
-                    else:
-                        return rmElements(subDict, els=els, rev=rev)
-                else:
-                    for key in subDict.keys():
-                        if isinstance(subDict[key], dict):
-                             subDict[key] = \
-                                 traverse(subDict[key], currentDepth + 1)
-                    else:
-                        return None
 
-            traverse(res)
+def kill(proc: Any) -> None:
+    """
+    Kill a process started in its own session by `Command` or `AsyncCommand`,
+    along with anything it spawned that could still be holding its stdout.
+    """
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+class Command:
+    """
+    Run a command (an argv list; there is no shell) and iterate over its
+    stdout lazily, line by line, as it's produced.
+
+        with Command(['zfs', 'list', '-H'], timeout=60) as lines:
+            for line in lines:
+                ...
+
+    Leaving the block before the output's exhausted kills the process. A
+    non-zero exit status, or running past `timeout` seconds, raises a
+    `CommandError`; anything written to stderr by a successful command is
+    ignored rather than treated as a failure.
+    """
+    def __init__(self, argv: List[str], timeout: Optional[float] =None) -> None:
+        self.argv = argv
+        self.timeout = timeout
+        self.exhausted = False
+        self.timedOut = False
+
+    def _expire(self) -> None:
+        self.timedOut = True
+        kill(self.proc)
+
+    def _lines(self) -> Iterator[str]:
+        for line in self.proc.stdout:  # type: ignore
+            yield line.rstrip('\n')
+        self.exhausted = True
+
+    def __enter__(self) -> Iterator[str]:
+        # A file rather than a pipe, so a chatty stderr can't fill up and
+        # stall the process while we're only reading stdout.
+        self.errors = tempfile.TemporaryFile()
+        self.proc = Popen(self.argv, stdout=PIPE, stderr=self.errors,
+                          universal_newlines=True, start_new_session=True)
+        self.timer = None  # type: Optional[threading.Timer]
+
+        if self.timeout is not None:
+            self.timer = threading.Timer(self.timeout, self._expire)
+            self.timer.daemon = True
+            self.timer.start()
+
+        return self._lines()
+
+    def __exit__(self, *args: Any) -> Any:
+        if not self.exhausted:
+            kill(self.proc)
+
+        self.proc.stdout.close()  # type: ignore
+        self.proc.wait()
+
+        if self.timer:
+            self.timer.cancel()
+
+        self.errors.seek(0)
+        stderr = self.errors.read().decode(errors='replace').strip()
+        self.errors.close()
+
+        if args[0] is not None:
+            return False
+
+        if self.timedOut:
+            raise CommandError(self.argv, self.proc.returncode, stderr,
+                               'timed out after {}s'.format(self.timeout))
+
+        if self.exhausted and self.proc.returncode != 0:
+            raise CommandError(self.argv, self.proc.returncode, stderr)
+
+
+class AsyncCommand:
+    """
+    `Command` for asyncio, so several commands can run at once.
+
+        async with AsyncCommand(['zfs', 'list', '-H']) as lines:
+            async for line in lines:
+                ...
+
+    or, for the whole output, `await AsyncCommand.output(argv)`.
+    """
+    def __init__(self, argv: List[str], timeout: Optional[float] =None) -> None:
+        self.argv = argv
+        self.timeout = timeout
+        self.exhausted = False
+        self.timedOut = False
+
+    async def __aenter__(self) -> 'AsyncCommand':
+        loop = asyncio.get_event_loop()
+        self.deadline = None if self.timeout is None \
+            else loop.time() + self.timeout
+        self.errors = tempfile.TemporaryFile()
+        self.proc = await asyncio.create_subprocess_exec(
+            *self.argv, stdout=PIPE, stderr=self.errors, start_new_session=True
+        )
+        return self
+
+    def __aiter__(self) -> 'AsyncCommand':
+        return self
+
+    async def __anext__(self) -> str:
+        if self.deadline is None:
+            line = await self.proc.stdout.readline()  # type: ignore
+        else:
+            remaining = self.deadline - asyncio.get_event_loop().time()
+            try:
+                line = await asyncio.wait_for(
+                    self.proc.stdout.readline(),  # type: ignore
+                    max(remaining, 0)
+                )
+            except asyncio.TimeoutError:
+                self.timedOut = True
+                kill(self.proc)
+                raise StopAsyncIteration
+
+        if not line:
+            self.exhausted = True
+            raise StopAsyncIteration
+
+        return line.decode().rstrip('\n')
+
+    async def __aexit__(self, *args: Any) -> Any:
+        if not self.exhausted and self.proc.returncode is None:
+            kill(self.proc)
+
+        await self.proc.wait()
+
+        self.errors.seek(0)
+        stderr = self.errors.read().decode(errors='replace').strip()
+        self.errors.close()
+
+        if args[0] is not None:
+            return False
+
+        if self.timedOut:
+            raise CommandError(self.argv, self.proc.returncode, stderr,
+                               'timed out after {}s'.format(self.timeout))
+
+        if self.exhausted and self.proc.returncode != 0:
+            raise CommandError(self.argv, self.proc.returncode, stderr)
+
+    @classmethod
+    async def output(cls, argv: List[str],
+                     timeout: Optional[float] =None) -> List[str]:
+        """
+        All of a command's stdout, as a list of lines.
+        """
+        lines = []  # type: List[str]
+        async with cls(argv, timeout) as command:
+            async for line in command:
+                lines.append(line)
+        return lines
+
 
-            return res
-        return _fn
-    return _decor
+class Projection:
+    """
+    A declarative filter for nested dictionaries, with one rule per depth:
+    keep only the keys in a set (`'include'`), or keep all but those
+    (`'exclude'`). Deeper levels are left alone, as are non-dictionary values.
+
+        Projection(('exclude', ['<swap>']), ('include', ['capacity', 'used']))
+
+    Rules are compiled into frozensets once, and `apply` filters in a single
+    traversal.
+    """
+    def __init__(self, *levels: Tuple[str, Iterable[Any]]) -> None:
+        for mode, _ in levels:
+            if mode not in ('include', 'exclude'):
+                raise ValueError('Expected \'include\' or \'exclude\', '
+                                 'received {}'.format(mode))
+
+        self.levels = tuple(
+            (frozenset(keys), mode == 'include') for mode, keys in levels
+        )
+
+    def apply(self, tree: Mapping, depth: int =0) -> Dict:
+        """
+        Return a filtered copy of `tree`.
+        """
+        keys, include = self.levels[depth]
+        deeper = depth + 1 < len(self.levels)
+
+        return {
+            key: self.apply(value, depth + 1)
+                 if deeper and isinstance(value, Mapping) else value
+            for key, value in tree.items() if (key in keys) is include
+        }
+
+    def path(self, *prefix: Any) -> Tuple:
+        """
+        This projection below `prefix`, as a `ConvertJSON.decode` select path,
+        so the parser can skip whatever the include rules would drop.
+        Exclusions can't be pushed down this way; they become wildcards.
+        """
+        return prefix + tuple(
+            tuple(sorted(keys)) if include else '*'  # ConvertJSON.wildcard
+            for keys, include in self.levels
+        )
 
 
 # Filter volume info and select/reject those entries we don't need.
 
-@rmElementsDec(['capacity', 'used'], rev=True, level=1)
-@rmElementsDec(['BOOT', 'Recovery', 'System Reserved'], level=0)
-def windows(info: Dict) -> Dict[str, Dict[str, int]]:
+windowsVolumes = Projection(
+    ('exclude', ['BOOT', 'Recovery', 'System Reserved']),
+    ('include', ['capacity', 'used'])
+)
+
+linuxVolumes = Projection(
+    ('exclude', ['<swap>']),
+    ('include', ['capacity', 'used'])
+)
+
+
+def windows(info: Mapping) -> Dict[str, Dict[str, int]]:
     """
     Extract information about Windows' volumes.
     """
-    volumes = info['Volumes']  # type: Dict[str, Dict[str, int]]
+    volumes = windowsVolumes.apply(info['Volumes'])
 
     # As an annoying aside, it appears *Info keys associated with Windows use a
     # string type for `capacity` data and integers for `used`, whereas in Linux
@@ -155,46 +368,383 @@ def windows(info: Dict) -> Dict[str, Dict[str, int]]:
     return volumes
 
 
-@rmElementsDec(['capacity', 'used'], rev=True, level=1)
-@rmElementsDec(['<swap>'], level=0)
-def linux(info: Dict) -> Dict[str, Dict[str, int]]:
+def linux(info: Mapping) -> Dict[str, Dict[str, int]]:
     """
     Extract information about mountpoints and disks.
     """
-    mounts = info['Volumes']  # type: Dict[str, Dict[str, int]]
+    mounts = linuxVolumes.apply(info['Volumes'])
 
     return mounts
 
 
-def getInfo(uuid: List[str]) -> List[List[Dict[str, Dict[str, int]]]]:
+# Everything `getInfo` reads from an agentInfo file; the rest is skipped.
+agentInfoFields = [linuxVolumes.path('Volumes'),
+                   windowsVolumes.path('Volumes'), 'type', 'os']
+
+
+def readSnapshot(uuid: str, snap: str) -> Optional[Dict[str, Dict[str, int]]]:
+    """
+    Extract volume information from one snapshot's agentInfo file, or None if
+    the snapshot doesn't have one.
+    """
+    path = infoPath(uuid, snap)
+
+    if not os.path.isfile(path):
+        return None
+
+    with ConvertJSON(path, select=agentInfoFields) as info:
+        if 'type' in info and info['type'].lower() == 'linux':
+            # Linux (info[type] => 'linux')
+            return linux(info)
+        elif info['os'].lower().startswith('windows'):
+            # Windows (is there a better validation?)
+            return windows(info)
+        else:
+            # Mac OS, other ?
+            raise UnsupportedOSError('Received {}'.format(info['os']))
+
+
+def ingestSnapshot(snapshot: Tuple[str, str]) \
+        -> Tuple[Optional[Dict[str, Dict[str, int]]], Optional[str],
+                 Tuple[float, float, int]]:
+    """
+    Call `readSnapshot` on a (uuid, snapshot) pair, returning its result and
+    an error message in place of raising, so one bad agentInfo file (possibly
+    in a worker process) doesn't bring down the whole run.
+
+    Also returns what it cost, as (wall, CPU seconds, bytes read), for
+    `timings` in the parent process.
+    """
+    wall, cpu = perf_counter(), process_time()
+
+    try:
+        volumes, error = readSnapshot(*snapshot), None
+    except Exception as err:
+        volumes, error = None, '{}: {}'.format(type(err).__name__, err)
+
+    try:
+        size = os.stat(infoPath(*snapshot)).st_size
+    except OSError:
+        size = 0
+
+    return volumes, error, \
+        (perf_counter() - wall, process_time() - cpu, size)
+
+
+def mergeParsed(uuid: str, snapshots: List[Tuple[str, int]],
+                cached: Optional['SnapshotCache'],
+                parsed: Dict[str, Tuple[Optional[Dict[str, Dict[str, int]]],
+                                        Optional[str],
+                                        Tuple[float, float, int]]]) \
+        -> Iterator[Tuple[str, int, Optional[Dict[str, Dict[str, int]]]]]:
+    """
+    Put an agent's freshly `parsed` and `cached` snapshots back together in
+    snapshot order, yielding (snapshot, epoch, volumes); volumes is None for
+    snapshots without an agentInfo file. Newly parsed snapshots are added to
+    the cache; those that failed to parse are reported on stderr and skipped.
+    """
+    for snap, epoch in snapshots:
+        if snap in parsed:
+            volumes, error, cost = parsed[snap]
+            timings.add('snapshot', *cost)
+            if error:
+                print('** ERROR: {}@{}: {}'.format(uuid, snap, error),
+                      file=sys.stderr)
+                continue
+            if cached is not None:
+                cached[snap] = volumes
+        else:
+            volumes = cached[snap]  # type: ignore
+        yield snap, epoch, volumes
+
+
+def parseChunk(uuid: str, chunk: List[Tuple[str, int]],
+               cached: Optional['SnapshotCache'],
+               pool: Optional[Executor] =None,
+               jobs: Optional[int] =None) \
+        -> Iterator[Tuple[str, int, Optional[Dict[str, Dict[str, int]]]]]:
+    """
+    Parse whichever of an agent's (snapshot, epoch) pairs in `chunk` aren't
+    `cached`, across `pool` if there is one, and `mergeParsed` them. Given the
+    pool's `jobs`, snapshots are handed out several at a time rather than one
+    by one.
+    """
+    pending = [(uuid, snap) for snap, _ in chunk
+               if cached is None or snap not in cached]
+
+    if pool:
+        results = pool.map(
+            ingestSnapshot, pending,
+            chunksize=max(1, len(pending) // (4 * jobs)) if jobs else 1
+        )  # type: Iterable
+    else:
+        results = map(ingestSnapshot, pending)
+
+    parsed = dict(zip((snap for _, snap in pending), results))
+
+    return mergeParsed(uuid, chunk, cached, parsed)
+
+
+def collectSnapshots(snapshots: Iterable[Tuple[str, int,
+                                                Optional[Dict[str, Dict[str, int]]]]],
+                     collapse: bool =False) -> 'VolumeHistory':
+    """
+    The (snapshot, epoch, volumes) of `parseChunk` or `mergeParsed` as a
+    `VolumeHistory` (run-length encoded if `collapse`).
+    """
+    return VolumeHistory.fromSnapshots(
+        ((epoch, volumes) for _, epoch, volumes in snapshots
+         if volumes is not None),
+        collapse
+    )
+
+
+def getInfo(uuid: List[str], index: Optional['ZFSIndex'] =None,
+            cache: bool =True, rebuildCache: bool =False,
+            jobs: int =1, collapse: bool =False) -> List['VolumeHistory']:
     """
     Collect information about a UUID/agent and print it to the terminal.
+
+    Each agent's snapshots come from `index` (by default, its `.zfs/snapshot`
+    directory) in creation order, and are returned as a `VolumeHistory`.
+
+    Snapshots are immutable, so unless `cache` is False, what's extracted from
+    each one is kept in a per-agent `SnapshotCache` for the next run. Snapshots
+    that aren't cached are parsed across `jobs` worker processes; results come
+    back in snapshot order regardless, and snapshots that fail to parse are
+    reported on stderr and skipped.
     """
+    if index is None:
+        index = ZFSIndex.fromSnapshotDirectories(uuid)
+
     # Now that we have the agent, let's go print the information we need.
     allSnaps = []
 
-    for id in uuid:
-        snaps = []
-        for snap in os.listdir(agentMountpoint + id + '/.zfs/snapshot/'):
-            path = infoPath(id, snap)
-            if os.path.isfile(path):
-                with ConvertJSON(path) as info:
-                    if 'type' in info and info['type'].lower() == 'linux':
-                        # Linux (info[type] => 'linux')
-                        snaps.append(linux(info))
-                    elif info['os'].lower().startswith('windows'):
-                        # Windows (is there a better validation?)
-                        snaps.append(windows(info))
-                    else:
-                        # Mac OS, other ?
-                        raise UnsupportedOSError(
-                            'Received {}'.format(info['os'])
-                        )
-        allSnaps.append(snaps)
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+
+    try:
+        for id in uuid:
+            with timings.phase('getInfo ' + id), \
+                    SnapshotCache(id, enabled=cache, rebuild=rebuildCache) \
+                    as cached:
+                snapshots = index.snapshots.get(id, [])
+
+                # Evict snapshots that have since been destroyed.
+                if not index.partial:
+                    cached.retain([snap for snap, _ in snapshots])
+
+                allSnaps.append(collectSnapshots(
+                    parseChunk(id, snapshots, cached, pool, jobs), collapse
+                ))
+    finally:
+        if pool:
+            pool.shutdown()
 
     return allSnaps
 
 
+def streamInfo(uuid: str, index: 'ZFSIndex',
+               pool: Optional[Executor] =None,
+               batch: int =256,
+               cached: Optional['SnapshotCache'] =None) \
+        -> Iterator[Tuple[int, Dict[str, Dict[str, int]]]]:
+    """
+    `getInfo` for one agent as a generator, yielding (epoch, volumes) pairs in
+    snapshot order while holding at most `batch` parsed snapshots at a time.
+    The snapshot cache is bypassed, since it would hold the whole history,
+    unless an open one is passed as `cached`.
+    """
+    snapshots = iter(index.snapshots.get(uuid, []))
+
+    while True:
+        chunk = list(islice(snapshots, batch))
+        if not chunk:
+            return
+
+        for _, epoch, volumes in parseChunk(uuid, chunk, cached, pool):
+            if volumes is not None:
+                yield epoch, volumes
+
+
+async def ingestAgent(uuid: str, index: 'ZFSIndex', executor: Executor,
+                      cache: bool =True, rebuildCache: bool =False,
+                      collapse: bool =False) -> 'VolumeHistory':
+    """
+    `getInfo` for one agent as a coroutine. Every uncached snapshot is handed
+    to `executor` up front, so reading and decoding them overlaps with other
+    agents' work (and with rendering) instead of waiting its turn.
+    """
+    loop = asyncio.get_event_loop()
+
+    with SnapshotCache(uuid, enabled=cache, rebuild=rebuildCache) as cached:
+        snapshots = index.snapshots.get(uuid, [])
+        if not index.partial:
+            cached.retain([snap for snap, _ in snapshots])
+
+        pending = [(uuid, snap) for snap, _ in snapshots if snap not in cached]
+
+        results = await asyncio.gather(*[
+            loop.run_in_executor(executor, ingestSnapshot, snapshot)
+            for snapshot in pending
+        ])
+
+        parsed = dict(zip((snap for _, snap in pending), results))
+
+        return collectSnapshots(mergeParsed(uuid, snapshots, cached, parsed),
+                                collapse)
+
+
+async def presentAsync(uuids: List[str], index: 'ZFSIndex', jobs: int,
+                       cache: bool =True, rebuildCache: bool =False,
+                       collapse: bool =False, **presentation: Any) -> None:
+    """
+    Ingest all agents at once, but print each agent's table (in order) as
+    soon as it's ready, rather than after every agent has been parsed.
+    `presentation` is passed along to `PresentNiceColumns`.
+    """
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        agents = [
+            asyncio.ensure_future(
+                ingestAgent(uuid, index, executor, cache, rebuildCache,
+                            collapse)
+            ) for uuid in uuids
+        ]
+
+        try:
+            for uuid, agent in zip(uuids, agents):
+                PresentNiceColumns([await agent], [uuid],
+                                   **presentation).render()
+        finally:
+            for agent in agents:
+                agent.cancel()
+
+
+def summarizeAgents(uuids: List[str], index: 'ZFSIndex', count: int =1,
+                    cache: bool =True, jobs: int =1) \
+        -> Iterator[Tuple[float, str, str, int, int, int, Optional[int]]]:
+    """
+    Parse only the newest `count` snapshots of each agent that have volumes
+    (older ones are read in place of any without an agentInfo file, or that
+    fail to parse), yielding a row per agent and volume: (percent used, uuid,
+    volume, used, capacity, epoch, change in used across those snapshots, or
+    None with just the one). Figures are from the newest snapshot the volume
+    is in.
+
+    Parsed snapshots are added to the cache, but, unlike `getInfo`, nothing
+    is evicted from it, since only part of each agent's history is looked at.
+    """
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+
+    try:
+        for uuid in uuids:
+            snapshots = index.snapshots.get(uuid, [])
+            found = []  # type: List[Tuple[str, int, Optional[Dict[str, Dict[str, int]]]]]
+
+            with SnapshotCache(uuid, enabled=cache) as cached:
+                # Work back from the newest until enough have volumes.
+                while snapshots and len(found) < count:
+                    chunk = newest(snapshots, count - len(found))
+                    snapshots = snapshots[:len(snapshots) - len(chunk)]
+                    found = [snap for snap
+                             in parseChunk(uuid, chunk, cached, pool, jobs)
+                             if snap[2] is not None] + found
+
+            history = collectSnapshots(found)
+
+            for column, volume in enumerate(history.volumes):
+                present = history.present[column]
+                first = present.find(1)
+                last = present.rfind(1)
+                used = history.used[column][last]
+                capacity = history.capacity[column][last]
+                change = used - history.used[column][first] \
+                    if len(history) > 1 else None
+
+                yield (
+                    100 * used / capacity if capacity else 0.0,
+                    uuid, volume, used, capacity, history.epochs[last], change
+                )
+    finally:
+        if pool:
+            pool.shutdown()
+
+
+def storeAgents(uuids: List[str], index: 'ZFSIndex', store: 'VolumeStore',
+                cache: bool =True, jobs: int =1) -> None:
+    """
+    Add the volumes of every snapshot in `index` that `store` doesn't have yet,
+    a batch of snapshots per transaction. Snapshots that fail to parse are
+    reported on stderr and left out, to be tried again next time.
+
+    As with `summarizeAgents`, the cache is used but not pruned.
+    """
+    pool = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+
+    try:
+        for uuid in uuids:
+            stored = store.stored(uuid)
+            snapshots = iter([(snap, epoch)
+                              for snap, epoch in index.snapshots.get(uuid, [])
+                              if snap not in stored])
+
+            with SnapshotCache(uuid, enabled=cache) as cached:
+                while True:
+                    chunk = list(islice(snapshots, store.batchSize))
+                    if not chunk:
+                        break
+
+                    store.insert(uuid, list(
+                        parseChunk(uuid, chunk, cached, pool, jobs)
+                    ))
+    finally:
+        if pool:
+            pool.shutdown()
+
+
+def forecast(uuids: List[str], allSnaps: List['VolumeHistory']) \
+        -> Iterator[Tuple[Optional[int], str, str, int, int, int, float]]:
+    """
+    Project when each agent's volumes will fill up, yielding a row per agent
+    and volume: (epoch the trend reaches capacity, or None if it never does or
+    not before `forecastHorizon`, uuid, volume, used, capacity, epoch of those
+    figures, growth in bytes per day). Volumes in fewer than two snapshots are
+    left out.
+    """
+    for uuid, history in zip(uuids, allSnaps):
+        for column, volume in enumerate(history.volumes):
+            trend = history.trend(column)
+            if trend is None:
+                continue
+            rate, full = trend
+            if full is not None and not 0 <= full < forecastHorizon:
+                full = None
+            last = history.present[column].rfind(1)
+            yield (full, uuid, volume, history.used[column][last],
+                   history.capacity[column][last], history.epochs[last], rate)
+
+
+def collapseRuns(snapshots: Iterable[Tuple[int, Dict[str, Dict[str, int]]]]) \
+        -> Iterator[Tuple[int, Dict[str, Dict[str, int]], int, int]]:
+    """
+    Run-length encode (epoch, volumes) pairs as they arrive, yielding
+    (first epoch, volumes, count, last epoch) per run of consecutive
+    snapshots with identical volumes.
+    """
+    run = None  # type: Optional[List[Any]]
+
+    for epoch, volumes in snapshots:
+        if run is not None and volumes == run[1]:
+            run[2] += 1
+            run[3] = epoch
+            continue
+        if run is not None:
+            yield tuple(run)  # type: ignore
+        run = [epoch, volumes, 1, epoch]
+
+    if run is not None:
+        yield tuple(run)  # type: ignore
+
+
 class InvalidArrayFormat(SyntaxError):
     """
     Raised when the input "compressed" JSON format is invalid.
@@ -213,6 +763,22 @@ class InvalidAgentNumberError(ValueError):
     """
 
 
+class CommandError(ValueError):
+    """
+    Raised when a command exits with a non-zero status, or times out.
+    """
+    def __init__(self, argv: List[str], returncode: Optional[int], stderr: str,
+                       reason: Optional[str] =None) -> None:
+        self.argv = argv
+        self.returncode = returncode
+        self.stderr = stderr
+        super().__init__('Command {} {}: {}'.format(
+            ' '.join(argv),
+            reason or 'exited with status {}'.format(returncode),
+            stderr
+        ))
+
+
 class Color:
     """
     `xterm` colors for coloring fonts written to stdout.
@@ -260,363 +826,2044 @@ class Color:
         print('\033[0m', end='', sep='')
 
 
-class ConvertJSON:
-    """
-    Parse/convert serialized JSON to Python dictionaries.
-
-    Pasting this code here for an all-in-one, so we don't have to install a
-    library for this script to work.
+class Timings:
     """
+    Wall and CPU time, counts and bytes read per phase of a run, e.g.
 
-    # Match these 'tokens'
-    integer = r'^i:[0-9]+;?'
-    double  = r'^d:[0-9]+\.?([0-9]*)?;?'  # type introduced in IBU >500 *Info's?
-    string  = r'^s:[0-9]+:\"[^\"]*\";?'
-    array   = r'^a:[0-9]+:{'
-    boolean = r'^b:[01];?'
-    endArr  = r'^}'
-    Ns      = r'^N;?'  # For some reason, show up in Rescue agent keys.
+        with timings.phase('render'):
+            ...
 
-    lexer = re.compile('({}|{}|{}|{}|{}|{}|{})'.format(integer, double, string,
-                                                 array, endArr, boolean, Ns))
+    for `--timings`. With `profile` set, each outermost phase is also run
+    under `cProfile`, so the slowest one's stats can be dumped afterwards.
+    """
+    def __init__(self, profile: bool =False) -> None:
+        self.profile = profile
+        self.phases = {}  # type: Dict[str, List[Any]]
+        self.profiles = {}  # type: Dict[str, cProfile.Profile]
+        self.depth = 0
+
+    def add(self, name: str, wall: float, cpu: float, nbytes: int =0,
+                  count: int =1) -> None:
+        """
+        Record `count` more occurrences of phase `name`.
+        """
+        phase = self.phases.setdefault(name, [0.0, 0.0, 0, 0])
+        phase[0] += wall
+        phase[1] += cpu
+        phase[2] += count
+        phase[3] += nbytes
 
-    # `:' between parentheses will break unpacking if we just `.split(':')`
-    colonStringSplit = re.compile(r'(?<=s):|:(?=")')
+    def phase(self, name: str) -> 'Phase':
+        return Phase(self, name)
 
-    def __init__(self, key: Optional[str] =None) -> None:
+    def slowest(self) -> Optional[str]:
         """
-        Optionally set self.key value. If `key` is set in `self.decode`,
-        however, this value is overwritten.
+        The profiled phase that took the longest.
         """
-        self.key = key
+        if not self.profiles:
+            return None
+        return max(self.profiles, key=lambda name: self.phases[name][0])
 
-    def decode(self, key: Optional[str] =None) -> Dict:
+    def report(self, form: str ='text', out: Optional[TextIO] =None) -> None:
         """
-        Map serialized JSON -> Dict.
+        Write the phases out (to stderr by default), in order of first
+        occurrence, as a table or as JSON.
         """
-        if key:
-            # Overwrite.
-            self.key = key
+        out = out or sys.stderr
+
+        if form == 'json':
+            json.dump({'phases': [
+                {'name': name, 'wall': wall, 'cpu': cpu, 'count': count,
+                 'bytes': nbytes}
+                for name, (wall, cpu, count, nbytes) in self.phases.items()
+            ]}, out)
+            print(file=out)
+            return
+
+        width = max(map(len, self.phases), default=5)
+        print('{:<{}}  {:>10}  {:>10}  {:>8}  {:>12}'.format(
+            'phase', width, 'wall (s)', 'cpu (s)', 'count', 'bytes'
+        ), file=out)
+        for name, (wall, cpu, count, nbytes) in self.phases.items():
+            print('{:<{}}  {:>10.3f}  {:>10.3f}  {:>8}  {:>12}'.format(
+                name, width, wall, cpu, count, nbytes
+            ), file=out)
+
+    def dumpProfile(self, path: str ='-') -> None:
+        """
+        Dump the slowest phase's `cProfile` stats; to stderr, sorted by
+        cumulative time, if `path` is '-', or else to `path` for `pstats`.
+        """
+        name = self.slowest()
+        if name is None:
+            return
+
+        if path == '-':
+            print('Profile of slowest phase, {}:'.format(name), file=sys.stderr)
+            stats = pstats.Stats(self.profiles[name], stream=sys.stderr)
+            stats.sort_stats('cumulative').print_stats(25)
         else:
-            if not self.key:
-                raise ValueError(
-                    'ERROR: `decode` expected key value, received {}'\
-                        .format(type(key))
-                )
-
-        if not os.path.isfile(self.key):
-            raise FileNotFoundError('File {} does not exist'.format(key))
-
-        with open(self.key, 'r') as keykeyData:
-            keyData = keykeyData.readline().rstrip()
-
-        def nestLevel(currentList: Optional[List] =None) -> List:
-            """
-            Allow the traversal of all nested levels.
-            """
-            nonlocal keyData
-
-            if currentList is None:
-                currentList = []
-
-            while keyData:
-                # Can't wait till assignment expressions!
-                result = re.search(self.lexer, keyData)
-
-                if not result:
-                    # Show what it's stuck on so we can debug/fix it.
-                    raise InvalidArrayFormat(keyData)
-
-                start, end = result.span()
-                substring = keyData[:end]
-                keyData = keyData[end:]
-
-                if substring.endswith(';'):
-                    substring = substring[:-1]
-
-                # Parse.
-                if substring.startswith('a'):
-                    currentList.append(nestLevel([]))
-                elif substring.startswith('i'):
-                    _, value = substring.split(':')
-                    currentList.append(int(value))
-                elif substring.startswith('d'):
-                    _, value = substring.split(':')
-                    currentList.append(float(value))
-                elif substring.startswith('s'):
-                    _, _, value = re.split(self.colonStringSplit, substring)
-                    value = value[1:len(value) - 1]
-                    currentList.append(value)
-                elif substring.startswith('b'):
-                    _, value = substring.split(':')
-                    currentList.append(bool(value))
-                elif substring.startswith('N'):
-                    # Unnecessary to include, as far as I can tell; ignore.
-                    pass
-                elif substring.startswith('}'):
-                    return currentList
-            return currentList
+            self.profiles[name].dump_stats(path)
 
-        def convert(multiLevelArray: List) -> Dict:
-            """
-            Convert our multi-level list to a dictionary of dictionaries ...
-            """
-            length = len(multiLevelArray)
-            currentDict = {}
 
-            for i, j in zip(range(0, length - 1, 2), range(1, length, 2)):
-                key, val = multiLevelArray[i], multiLevelArray[j]
-                if type(val) is list:
-                    currentDict[key] = convert(val)
-                else:
-                    currentDict[key] = val
+class Phase:
+    """
+    Time one occurrence of a phase; see `Timings.phase`.
+    """
+    def __init__(self, timings: Timings, name: str) -> None:
+        self.timings = timings
+        self.name = name
+        self.profiler = None  # type: Optional[cProfile.Profile]
+
+    def __enter__(self) -> 'Phase':
+        if self.timings.profile and self.timings.depth == 0:
+            # Only one profiler can be active at a time.
+            self.profiler = self.timings.profiles.setdefault(
+                self.name, cProfile.Profile()
+            )
+            self.profiler.enable()
+
+        self.timings.depth += 1
+        self.wall, self.cpu = perf_counter(), process_time()
+        return self
 
-            return currentDict
+    def __exit__(self, *args: Any) -> Any:
+        self.timings.add(self.name, perf_counter() - self.wall,
+                         process_time() - self.cpu)
+        self.timings.depth -= 1
 
-        return convert(nestLevel()[0])
+        if self.profiler:
+            self.profiler.disable()
 
-    @staticmethod
-    def find(nestedDicts: Dict, key: Any) -> Any:
-        """
-        Return the first occurrence of value associated with `key`. O(n) for `n`
-        items in the flattened data.
 
-        (Iterable b => b -> a) so we can map over partial applications.
-        """
+# Shared by everything that's instrumented; reported by `main`.
+timings = Timings()
 
-        def traverse(nested: Dict) -> Any:
-            nonlocal key
-            for ky, value in list(nested.items()):
-                if ky == key:
-                    return value
-                if type(value) is dict:
-                    res = traverse(value)
-                    if res:
-                        return res
 
-        return traverse(nestedDicts)
+class SerialScanner:
+    """
+    Walk a serialized buffer with a cursor instead of re-slicing the remaining
+    text for every token, so decoding is linear in the size of the buffer.
+    String bodies are jumped over by their `s:N:` length prefix, which means
+    embedded `"`, `;` or `}` characters are harmless.
 
-    @staticmethod
-    def findAll(nestedDicts: Dict, key: Any, rvrsLookup: bool =False) -> List:
-        """
-        Return all occurrences of values associated with `key`, if any. Again,
-        O(n). If `rvrsLookup`, searches by value and returns the associated
-        keys. (Essentially a reverse lookup.)
-        """
-        occurrences = []
+    Methods take and return byte offsets into `self.buf`, which may be any
+    object supporting `len`, indexing, slicing and `find` (`bytes`, `mmap`).
+    """
 
-        def traverse(nested: Dict) -> None:
-            nonlocal key, occurrences
-            for ky, value in list(nested.items()):
-                if rvrsLookup:
-                    if value == key:
-                        occurrences.append(ky)
-                else:
-                    if ky == key:
-                        occurrences.append(value)
-                if type(value) is dict:
-                    traverse(value)
+    # Match these 'tokens' at the cursor (the leading tag is checked by hand).
+    length  = re.compile(br'[0-9]+')
+    integer = re.compile(br'-?[0-9]+')
+    double  = re.compile(br'-?(?:[0-9]+(?:\.[0-9]*)?(?:[Ee][-+]?[0-9]+)?|INF|NAN)')
 
-        traverse(nestedDicts)
-        return occurrences
+    # Any one token, for `skip`; string bodies are stepped over by hand.
+    token = re.compile(br's:([0-9]+):"|a:[0-9]+:\{|}|N;?|b:[01];?|'
+                       br'i:-?[0-9]+;?|'
+                       br'd:-?(?:[0-9]+(?:\.[0-9]*)?(?:[Ee][-+]?[0-9]+)?|INF|NAN);?')
 
-    def __enter__(self) -> Dict:
-        return self.decode()
+    # Tags, as `self.buf[pos]` yields integers.
+    ARRAY, STRING, INTEGER, DOUBLE, BOOLEAN, NULL, OPEN, END, COLON, QUOTE, \
+        SEMI = b'asidbN{}:";'
 
-    def __exit__(self, *args: Any) -> Any:
-        pass
+    def __init__(self, buf: Union[bytes, mmap.mmap]) -> None:
+        self.buf = buf
+        self.size = len(buf)
 
+    def error(self, pos: int) -> InvalidArrayFormat:
+        """
+        Show what it's stuck on so we can debug/fix it.
+        """
+        return InvalidArrayFormat(
+            self.buf[pos:pos + 80].decode(errors='replace')
+        )
 
-class PresentNiceColumns:
-    """
-    Present the information in straight columns; this is probably my least
-    favorite part of this script :/ So ugly.
-    """
-    def __init__(self, allSnaps: List[List[Dict[str, Dict[str, int]]]],
-                       uuids: List[str],
-                       binary: bool =True,
-                       noscale: bool =False,
-                       color: bool =True,
-                       localtime: bool  =False) -> None:
-        self.allSnaps = allSnaps
-        self.uuids = uuids
-        self.binary = binary
-        self.fixes = ['B '] + [fix + ('i' if self.binary else 'B')
-                      for fix in ['K', 'M', 'G', 'T', 'P', 'E', 'Z']]
-        self.noscale = noscale
-        self.color = color
-        self.localtime = localtime
+    def _tag(self, pos: int) -> int:
+        if pos >= self.size:
+            raise self.error(pos)
+        return self.buf[pos]
 
-    def render(self) -> None:
+    def _end(self, pos: int) -> int:
         """
-        Print these agents' snapshots in nice visual columns.
+        Step over the optional `;` terminating a scalar.
         """
-        for uuid, agent in zip(self.uuids, self.allSnaps):
-            if len(agent) == 0:
-                with Color.red(), Color.bold():
-                    print('** ERROR: no snapshots for {}'.format(uuid))
-                continue
+        if pos < self.size and self.buf[pos] == self.SEMI:
+            return pos + 1
+        return pos
 
-            # Type safe conversion/storage of the former dictionary.
-            _agent = []  # type: List[Dict[str, Dict[str, str]]]
-
-            # Get column widths for this agent prior to presentation.
-            nCols = 4 * len(agent[0])
-            colWidths = [0] * nCols
-
-            for snap in agent:
-                # Type checks because OrderedDict <: Dict.
-                _snap = OrderedDict()  # type: Dict[str, Dict[str, str]]
-                
-                for volume in snap:
-                    _used = snap[volume]['used']
-                    _capacity = snap[volume]['capacity']
-                    if self.noscale:
-                        used = str(_used)
-                        capacity = str(_capacity)
-                    else:
-                        used = self.scale(_used)
-                        capacity = self.scale(_capacity)
-
-                    # Build new ordered entry.
-                    vol = volume + '-'
-                    _snap[vol] = OrderedDict()
-                    _snap[vol]['used'] = str(used)
-                    _snap[vol]['capacity'] = str(capacity)
-                    _snap[vol]['percent'] \
-                        = '{0:.1f}%'.format(100 * _used / _capacity)
-
-                _agent.append(_snap)
-
-            for _snap in _agent:
-                # Auto-expand if disks were added somewhere along the line.
-                if len(_snap) > nCols // 4:
-                    colWidths += [0] * 4 * (len(_snap) - nCols // 4)
-
-                snapshot = self._flatten(_snap)
-                for i, column in enumerate(snapshot):
-                    width = len(column)
-                    if colWidths[i] < width:
-                        colWidths[i] = width
-
-            with getIO('zfs list -t snapshot -Hro name homePool/home/agents/'
-                       + uuid + '| grep -oP "(?<=@)[^\s]+"') as epochs:
-                # Now print these columns with proper widths to the terminal.
-                for epoch, _snap in zip(epochs, _agent):
-                    # Print the converted epoch time.
-                    if self.color:
-                        with Color.bold():
-                            print(time(int(epoch), self.localtime) + ' ~',
-                                  sep='', end=' ')
-                    else:
-                        print(time(int(epoch), self.localtime) + ' ~', sep='',
-                              end=' ')
-                    snapshot = self._flatten(_snap)
-
-                    for i, column in enumerate(snapshot):
-                        if i % 4 == 0 and i != 0:
-                            print(' ', end='')
-                        if i % 4 == 0 and self.color:
-                            with Color.red():
-                                print(self._extend(column, colWidths[i]),
-                                      end=' ')
-                        else:
-                            print(self._extend(column, colWidths[i]), end=' ')
-                    else:
-                        print()
+    def _length(self, pos: int) -> Tuple[int, int]:
+        """
+        Read the `N:` of `s:N:` or `a:N:`, returning the count and the offset of
+        the byte that follows it.
+        """
+        match = self.length.match(self.buf, pos)
+        if not match or self._tag(match.end()) != self.COLON:
+            raise self.error(pos)
+        return int(match.group()), match.end() + 1
 
-    def scale(self, bts: int) -> str:
+    def _string(self, pos: int) -> Tuple[int, int]:
         """
-        Format volume used/capacity values to the correct binary or metric
-        magnitude (and hence prefix).
+        Locate the body of `s:N:"...";` at `pos` without reading it, returning
+        its start offset and the offset of the closing quote.
         """
-        
-        if bts < 0:
-            raise ValueError('Expected value >=0, received {}'.format(bts))
+        length, start = self._length(pos + 2)
+        stop = start + 1 + length
+        if self._tag(start) != self.QUOTE or self._tag(stop) != self.QUOTE:
+            raise self.error(pos)
+        return start + 1, stop
 
-        if self.binary:
-            if bts == 0:
-                return '0.00 Ki'
+    def _open(self, pos: int) -> int:
+        """
+        Step over the `a:N:{` header of the array at `pos`.
+        """
+        if self._tag(pos) != self.ARRAY or self._tag(pos + 1) != self.COLON:
+            raise self.error(pos)
 
-            for magnitude, prefix in zip(range(len(self.fixes)), self.fixes):
-                if 2 ** (10 * magnitude) <= bts < 2 ** (10 * (magnitude + 1)):
-                    bts /= 2 ** (10 * magnitude)
-                    return '{0:.2f}{1}'.format(bts, prefix)
-        else:
-            if bts == 0:
-                return '0.00 KB'
+        _, pos = self._length(pos + 2)
 
-            for magnitude, prefix in zip(range(len(self.fixes)), self.fixes):
-                if 10 ** (3 * magnitude) <= bts < 10 ** (3 * (magnitude + 1)):
-                    bts /= (10 ** (3 * magnitude))
-                    return '{0:.2f}{1}'.format(bts, prefix)
+        if self._tag(pos) != self.OPEN:
+            raise self.error(pos)
 
-        raise ValueError('Bytes received too large, received {}'.format(bts))
+        return pos + 1
 
-    @staticmethod
-    def _flatten(snap: Dict[str, Dict[str, str]]) -> List[str]:
+    def nulls(self, pos: int) -> int:
         """
-        Flatten one level of nested dictionaries.
+        Skip `N;` tokens. For some reason, they show up in Rescue agent keys;
+        they've never been necessary to include, as far as I can tell.
         """
-        ret = []
-
-        for volume in snap:
-            ret.append(volume)
-            for usage in snap[volume]:
-                ret.append(snap[volume][usage])
+        while pos < self.size and self.buf[pos] == self.NULL:
+            pos = self._end(pos + 1)
+        return pos
 
-        return ret
+    def scalar(self, pos: int) -> Tuple[Any, int]:
+        """
+        Decode the string, integer, double or boolean at `pos`.
+        """
+        tag = self._tag(pos)
+
+        if self._tag(pos + 1) != self.COLON:
+            raise self.error(pos)
+
+        if tag == self.STRING:
+            start, stop = self._string(pos)
+            return self.buf[start:stop].decode(), self._end(stop + 1)
+        elif tag == self.INTEGER:
+            match = self.integer.match(self.buf, pos + 2)
+            if not match:
+                raise self.error(pos)
+            return int(match.group()), self._end(match.end())
+        elif tag == self.DOUBLE:
+            match = self.double.match(self.buf, pos + 2)
+            if not match:
+                raise self.error(pos)
+            return float(match.group()), self._end(match.end())
+        elif tag == self.BOOLEAN:
+            if self._tag(pos + 2) not in b'01':
+                raise self.error(pos)
+            # The original lexer stored `bool('0')`, so every flag decodes as
+            # True; keep that so decoded dicts don't change underneath anyone.
+            return True, self._end(pos + 3)
+        else:
+            raise self.error(pos)
 
-    @staticmethod
-    def _extend(value: str, properWidth: int) -> str:
+    def skip(self, pos: int) -> int:
+        """
+        Step over the value at `pos` without building any Python objects for
+        it, returning the offset that follows it.
         """
-        Extend a string to the proper width.
+        buf, token = self.buf, self.token
+        depth = 0
+
+        while True:
+            match = token.match(buf, pos)
+            if not match:
+                raise self.error(pos)
+
+            pos = match.end()
+            tag = buf[match.start()]
+
+            if tag == self.STRING:
+                # Jump straight over the body by its length prefix.
+                pos += int(match.group(1))
+                if self._tag(pos) != self.QUOTE:
+                    raise self.error(match.start())
+                pos = self._end(pos + 1)
+            elif tag == self.ARRAY:
+                depth += 1
+            elif tag == self.END:
+                depth -= 1
+                if depth < 0:
+                    raise self.error(match.start())
+
+            if depth == 0:
+                return pos
+
+    def value(self, pos: int, select: Optional[Dict] =None) -> Tuple[Any, int]:
         """
-        return (' ' * abs(len(value) - properWidth)) + value
+        Decode the value at `pos`, be it a scalar or a nested array. `select`
+        is a projection compiled by `ConvertJSON.compileSelect`.
+        """
+        if self._tag(pos) == self.ARRAY:
+            return self.array(pos, select)
+        return self.scalar(pos)
 
+    def array(self, pos: int, select: Optional[Dict] =None) -> Tuple[Dict, int]:
+        """
+        Decode `a:N:{...}` into a dictionary. `N;` tokens are dropped before
+        pairing up keys and values, and a dangling key is ignored.
 
-def scriptLog() -> None:
+        If `select` is given, only keys it names (or matches with `'*'`) are
+        kept; every other value is skipped over rather than decoded.
+        """
+        currentDict = {}  # type: Dict
+        pos = self._open(pos)
+
+        while True:
+            pos = self.nulls(pos)
+            if self._tag(pos) == self.END:
+                return currentDict, pos + 1
+            if self.buf[pos] == self.ARRAY:
+                # Arrays are unhashable; they can't be keys.
+                raise self.error(pos)
+            key, pos = self.scalar(pos)
+
+            pos = self.nulls(pos)
+            if self._tag(pos) == self.END:
+                return currentDict, pos + 1
+
+            if select is None:
+                currentDict[key], pos = self.value(pos)
+            elif key in select:
+                currentDict[key], pos = self.value(pos, select[key])
+            elif ConvertJSON.wildcard in select:
+                currentDict[key], pos = \
+                    self.value(pos, select[ConvertJSON.wildcard])
+            else:
+                pos = self.skip(pos)
+
+
+class LazyArray(Mapping):
+    """
+    A read-only view of the serialized array at `pos`. Keys are scanned only
+    as far as needed to find the one asked for, and values are only decoded
+    when they're looked up (nested arrays as further `LazyArray`s), and kept
+    once they are. Key handling otherwise matches `SerialScanner.array`.
+
+    Over an `mmap`, this only pages in the bytes actually touched, so e.g.
+    `info['os']` is cheap on a file of any size; the map has to stay open
+    for as long as the view is used.
+    """
+    def __init__(self, scanner: SerialScanner, pos: int) -> None:
+        self.scanner = scanner
+        self.pos = pos
+        self.offsets = {}  # type: Dict[Any, int]
+        self.decoded = {}  # type: Dict[Any, Any]
+
+        # Where scanning for more keys resumes; None once it's reached `}`.
+        self.cursor = scanner._open(pos)  # type: Optional[int]
+
+    def scan(self, until: Any =None) -> None:
+        """
+        Record the offsets of further keys' values, stopping early once `until`
+        is found.
+        """
+        scanner, pos = self.scanner, self.cursor
+
+        while pos is not None:
+            pos = scanner.nulls(pos)
+            if scanner._tag(pos) == scanner.END:
+                pos = None
+                break
+            if scanner.buf[pos] == scanner.ARRAY:
+                raise scanner.error(pos)
+            key, pos = scanner.scalar(pos)
+
+            pos = scanner.nulls(pos)
+            if scanner._tag(pos) == scanner.END:
+                pos = None
+                break
+
+            self.offsets[key] = pos
+            pos = scanner.skip(pos)
+
+            if until is not None and key == until:
+                break
+
+        self.cursor = pos
+
+    def __getitem__(self, key: Any) -> Any:
+        if key in self.decoded:
+            return self.decoded[key]
+
+        if key not in self.offsets:
+            self.scan(until=key)
+
+        pos = self.offsets[key]
+
+        if self.scanner._tag(pos) == self.scanner.ARRAY:
+            value = LazyArray(self.scanner, pos)  # type: Any
+        else:
+            value = self.scanner.scalar(pos)[0]
+
+        self.decoded[key] = value
+        return value
+
+    def __iter__(self) -> Iterator[Any]:
+        self.scan()
+        return iter(self.offsets)
+
+    def __len__(self) -> int:
+        self.scan()
+        return len(self.offsets)
+
+    def __contains__(self, key: Any) -> bool:
+        if key not in self.offsets:
+            self.scan(until=key)
+        return key in self.offsets
+
+    def decode(self) -> Dict:
+        """
+        Decode the whole array into a dictionary.
+        """
+        return self.scanner.array(self.pos)[0]
+
+
+class PathIndex:
+    """
+    Every key in a decoded agentInfo, mapped to the paths and values it
+    occurs at, and every (hashable) value, mapped back to its keys; built in
+    one pass so `ConvertJSON.find` and `findAll` are lookups rather than
+    walks. Both keep the walks' (depth-first) order of occurrence. Reflects
+    the dictionary as it was when indexed.
+    """
+    def __init__(self, nestedDicts: Dict) -> None:
+        self.root = nestedDicts
+        self.byKey = {}  # type: Dict[Any, List[Tuple[Tuple, Any]]]
+        self.byValue = {}  # type: Dict[Any, List[Any]]
+
+        def traverse(nested: Dict, path: Tuple) -> None:
+            for ky, value in nested.items():
+                here = path + (ky,)
+                self.byKey.setdefault(ky, []).append((here, value))
+                try:
+                    self.byValue.setdefault(value, []).append(ky)
+                except TypeError:
+                    # Unhashable (nested dictionaries); see `findAll`.
+                    pass
+                if type(value) is dict:
+                    traverse(value, here)
+
+        traverse(nestedDicts, ())
+
+    def paths(self, key: Any) -> List[Tuple]:
+        """
+        Every path (a tuple of keys from the root) at which `key` occurs.
+        """
+        return [path for path, _ in self.byKey.get(key, [])]
+
+    def find(self, key: Any) -> Any:
+        occurrences = self.byKey.get(key)
+        return occurrences[0][1] if occurrences else None
+
+    def findAll(self, key: Any, rvrsLookup: bool =False) -> List:
+        if rvrsLookup:
+            try:
+                return list(self.byValue.get(key, []))
+            except TypeError:
+                # Looking up a dictionary by value; nothing to do but walk.
+                return ConvertJSON.findAll(self.root, key, rvrsLookup)
+        return [value for _, value in self.byKey.get(key, [])]
+
+
+class ConvertJSON:
+    """
+    Parse/convert serialized JSON to Python dictionaries.
+
+    Pasting this code here for an all-in-one, so we don't have to install a
+    library for this script to work.
+    """
+
+    # Matches any key at its depth in a `select` path.
+    wildcard = '*'
+
+    def __init__(self, key: Optional[str] =None,
+                       select: Optional[List[Any]] =None,
+                       index: bool =False,
+                       lazy: bool =False) -> None:
+        """
+        Optionally set self.key value. If `key` is set in `self.decode`,
+        however, this value is overwritten. Likewise for `select`, `index` and
+        `lazy`.
+        """
+        self.key = key
+        self.select = select
+        self.indexed = index
+        self.lazy = lazy
+        self.index = None  # type: Optional[PathIndex]
+        self.mapped = None  # type: Optional[mmap.mmap]
+
+    def decode(self, key: Optional[str] =None,
+                     select: Optional[List[Any]] =None,
+                     index: Optional[bool] =None,
+                     lazy: Optional[bool] =None) -> Union[Dict, LazyArray]:
+        """
+        Map serialized JSON -> Dict.
+
+        `select` restricts decoding to the listed paths, e.g.
+
+            [('Volumes', '*', ('capacity', 'used')), 'type', 'os']
+
+        keeps only `type`, `os` and each volume's `capacity` and `used`. Every
+        other subtree is skipped over without being decoded.
+
+        If `index` is set, a `PathIndex` of the result is also built, as
+        `self.index`, for repeated `find`/`findAll` lookups.
+
+        If `lazy` is set, the file is memory-mapped instead and a `LazyArray`
+        over it is returned (`select` and `index` don't apply). The map is
+        released by `close`, or on leaving the `with` block.
+        """
+        if select is not None:
+            self.select = select
+
+        if index is not None:
+            self.indexed = index
+
+        if lazy is not None:
+            self.lazy = lazy
+
+        if key:
+            # Overwrite.
+            self.key = key
+        else:
+            if not self.key:
+                raise ValueError(
+                    'ERROR: `decode` expected key value, received {}'\
+                        .format(type(key))
+                )
+
+        if not os.path.isfile(self.key):
+            raise FileNotFoundError('File {} does not exist'.format(key))
+
+        if self.lazy:
+            return self.map(self.key)
+
+        with open(self.key, 'rb') as keykeyData:
+            keyData = keykeyData.read()
+
+        decoded = self.loads(keyData, self.select)
+
+        self.index = PathIndex(decoded) if self.indexed else None
+
+        return decoded
+
+    def map(self, key: str) -> LazyArray:
+        """
+        Memory-map the file at `key` and scan its top-level keys.
+        """
+        self.close()
+
+        with open(key, 'rb') as keykeyData:
+            if not os.fstat(keykeyData.fileno()).st_size:
+                # Can't map an empty file.
+                raise InvalidArrayFormat('')
+            self.mapped = mmap.mmap(keykeyData.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+
+        scanner = SerialScanner(self.mapped)
+        pos = scanner.nulls(0)
+
+        if scanner._tag(pos) != SerialScanner.ARRAY:
+            raise scanner.error(pos)
+
+        return LazyArray(scanner, pos)
+
+    def close(self) -> None:
+        """
+        Release the map behind a lazy `decode`, if there is one.
+        """
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+
+    @classmethod
+    def loads(cls, keyData: bytes, select: Optional[List[Any]] =None) -> Dict:
+        """
+        Map a serialized buffer -> Dict. See `decode` regarding `select`.
+        """
+        scanner = SerialScanner(keyData)
+        pos = scanner.nulls(0)
+
+        if pos >= scanner.size or keyData[pos] != SerialScanner.ARRAY:
+            raise scanner.error(pos)
+
+        if select is None:
+            return scanner.array(pos)[0]
+        else:
+            return scanner.array(pos, cls.compileSelect(select))[0]
+
+    @classmethod
+    def compileSelect(cls, select: List[Any]) -> Dict:
+        """
+        Merge `select` paths into a tree of nested dictionaries, mapping each
+        key to the projection of its value (`None` meaning keep the whole
+        value). A path is a key or a tuple of steps, where each step is a key,
+        `'*'` or a tuple of alternative keys.
+        """
+        tree = {}  # type: Dict
+
+        def insert(node: Dict, path: Tuple) -> None:
+            """
+            Add one path below `node`.
+            """
+            step, rest = path[0], path[1:]
+            for key in (step if isinstance(step, tuple) else (step,)):
+                if not rest or (key in node and node[key] is None):
+                    # Keeping the whole value subsumes narrower paths.
+                    node[key] = None
+                else:
+                    insert(node.setdefault(key, {}), rest)
+
+        def merge(node: Dict, other: Dict) -> None:
+            """
+            Union `other` into `node`, in place.
+            """
+            for key, child in other.items():
+                if child is None or node.get(key, {}) is None:
+                    node[key] = None
+                else:
+                    merge(node.setdefault(key, {}), child)
+
+        def spread(node: Dict) -> None:
+            """
+            Explicit keys also receive whatever `'*'` selects at their depth.
+            """
+            if cls.wildcard in node:
+                for key in node:
+                    if key == cls.wildcard:
+                        continue
+                    if node[cls.wildcard] is None:
+                        node[key] = None
+                    elif node[key] is not None:
+                        merge(node[key], node[cls.wildcard])
+            for child in node.values():
+                if child is not None:
+                    spread(child)
+
+        for path in select:
+            insert(tree, path if isinstance(path, tuple) else (path,))
+
+        spread(tree)
+
+        return tree
+
+    @staticmethod
+    def find(nestedDicts: Union[Dict, 'PathIndex'], key: Any) -> Any:
+        """
+        Return the first occurrence of value associated with `key`. O(n) for `n`
+        items in the flattened data, or O(1) given a `PathIndex`.
+
+        (Iterable b => b -> a) so we can map over partial applications.
+        """
+        if isinstance(nestedDicts, PathIndex):
+            return nestedDicts.find(key)
+
+        missing = object()
+
+        def traverse(nested: Dict) -> Any:
+            nonlocal key
+            for ky, value in nested.items():
+                if ky == key:
+                    return value
+                if type(value) is dict:
+                    res = traverse(value)
+                    if res is not missing:
+                        return res
+            return missing
+
+        res = traverse(nestedDicts)
+
+        return None if res is missing else res
+
+    @staticmethod
+    def findAll(nestedDicts: Union[Dict, 'PathIndex'], key: Any,
+                rvrsLookup: bool =False) -> List:
+        """
+        Return all occurrences of values associated with `key`, if any. Again,
+        O(n), or O(1) given a `PathIndex`. If `rvrsLookup`, searches by value
+        and returns the associated keys. (Essentially a reverse lookup.)
+        """
+        if isinstance(nestedDicts, PathIndex):
+            return nestedDicts.findAll(key, rvrsLookup)
+
+        occurrences = []
+
+        def traverse(nested: Dict) -> None:
+            nonlocal key, occurrences
+            for ky, value in nested.items():
+                if rvrsLookup:
+                    if value == key:
+                        occurrences.append(ky)
+                else:
+                    if ky == key:
+                        occurrences.append(value)
+                if type(value) is dict:
+                    traverse(value)
+
+        traverse(nestedDicts)
+        return occurrences
+
+    def __enter__(self) -> Union[Dict, LazyArray]:
+        return self.decode()
+
+    def __exit__(self, *args: Any) -> Any:
+        self.close()
+
+
+class SnapshotCache:
+    """
+    Per-agent, on-disk cache of the filtered volume information `getInfo`
+    extracts from each snapshot, keyed by snapshot name. Snapshots without an
+    agentInfo file are remembered as None, so they aren't stat'ed again.
+
+    The file is a compact binary format: a magic header, followed by one record
+    per snapshot,
+
+        H name length, name, I volume count (or `absent`),
+            per volume: H name length, name, Q used, Q capacity
+
+    all little-endian. A cache that can't be read is simply rebuilt.
+    """
+
+    magic = b'BVIC\x01'
+    absent = 0xFFFFFFFF
+
+    def __init__(self, uuid: str, enabled: bool =True, rebuild: bool =False,
+                       directory: Optional[str] =None) -> None:
+        self.uuid = uuid
+        self.enabled = enabled
+        self.rebuild = rebuild
+        self.path = os.path.join(directory or cacheDirectory,
+                                 uuid + '.cache')
+        self.entries = {}  # type: Dict[str, Optional[Dict[str, Dict[str, int]]]]
+        self.dirty = False
+
+    def __contains__(self, snap: str) -> bool:
+        return snap in self.entries
+
+    def __getitem__(self, snap: str) -> Optional[Dict[str, Dict[str, int]]]:
+        return self.entries[snap]
+
+    def __setitem__(self, snap: str,
+                          volumes: Optional[Dict[str, Dict[str, int]]]) -> None:
+        if not self.enabled:
+            return
+
+        if volumes is not None:
+            for volume in volumes.values():
+                for field in ('used', 'capacity'):
+                    value = volume.get(field)
+                    if type(value) is not int or not 0 <= value < 2 ** 64:
+                        # Not representable; just parse it again next time.
+                        return
+
+        self.entries[snap] = volumes
+        self.dirty = True
+
+    def retain(self, snaps: List[str]) -> None:
+        """
+        Drop entries for snapshots that are no longer in `snaps`.
+        """
+        keep = set(snaps)
+        for snap in [snap for snap in self.entries if snap not in keep]:
+            del self.entries[snap]
+            self.dirty = True
+
+    def load(self) -> None:
+        """
+        Read the cache file, if there is a valid one.
+        """
+        try:
+            with open(self.path, 'rb') as cacheFile:
+                data = cacheFile.read()
+        except OSError:
+            return
+
+        try:
+            self.entries = self.unpack(data)
+        except (struct.error, ValueError, UnicodeDecodeError):
+            self.entries = {}
+            self.dirty = True
+
+    def save(self) -> None:
+        """
+        Atomically replace the cache file with the current entries.
+        """
+        temporary = self.path + '.{}.tmp'.format(os.getpid())
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temporary, 'wb') as cacheFile:
+                cacheFile.write(self.pack(self.entries))
+            os.replace(temporary, self.path)
+        except OSError as err:
+            print('WARNING: Could not write cache {}: {}'.format(self.path, err),
+                  file=sys.stderr)
+
+    @classmethod
+    def pack(cls, entries: Dict[str, Optional[Dict[str, Dict[str, int]]]]) \
+            -> bytes:
+        """
+        Serialize cache entries.
+        """
+        out = [cls.magic]
+
+        def name(string: str) -> None:
+            encoded = string.encode()
+            out.append(struct.pack('<H', len(encoded)))
+            out.append(encoded)
+
+        for snap, volumes in entries.items():
+            name(snap)
+            if volumes is None:
+                out.append(struct.pack('<I', cls.absent))
+                continue
+            out.append(struct.pack('<I', len(volumes)))
+            for volume, usage in volumes.items():
+                name(volume)
+                out.append(struct.pack('<QQ', usage['used'], usage['capacity']))
+
+        return b''.join(out)
+
+    @classmethod
+    def unpack(cls, data: bytes) \
+            -> Dict[str, Optional[Dict[str, Dict[str, int]]]]:
+        """
+        Deserialize cache entries; the inverse of `pack`.
+        """
+        if not data.startswith(cls.magic):
+            raise ValueError('Not a cache file')
+
+        entries = {}  # type: Dict[str, Optional[Dict[str, Dict[str, int]]]]
+        pos = len(cls.magic)
+
+        def name() -> str:
+            nonlocal pos
+            length, = struct.unpack_from('<H', data, pos)
+            pos += 2 + length
+            if pos > len(data):
+                raise ValueError('Truncated cache file')
+            return data[pos - length:pos].decode()
+
+        while pos < len(data):
+            snap = name()
+            count, = struct.unpack_from('<I', data, pos)
+            pos += 4
+            if count == cls.absent:
+                entries[snap] = None
+                continue
+            volumes = {}  # type: Dict[str, Dict[str, int]]
+            for _ in range(count):
+                volume = name()
+                used, capacity = struct.unpack_from('<QQ', data, pos)
+                pos += 16
+                volumes[volume] = {'capacity': capacity, 'used': used}
+            entries[snap] = volumes
+
+        return entries
+
+    def __enter__(self) -> 'SnapshotCache':
+        if self.enabled:
+            if self.rebuild:
+                self.dirty = True
+            else:
+                self.load()
+        return self
+
+    def __exit__(self, *args: Any) -> Any:
+        if self.enabled and self.dirty:
+            self.save()
+
+
+class ZFSProvider:
+    """
+    Run `zfs list` over every agent dataset and its snapshots, in one call.
+    Point `binary` elsewhere (or put a stand-in `zfs` first on PATH) to test
+    against a fake pool.
+    """
+    def __init__(self, binary: str ='zfs', dataset: str =agentDataset,
+                       timeout: Optional[float] =None) -> None:
+        self.binary = binary
+        self.dataset = dataset
+        self.timeout = timeout
+
+    def argv(self) -> List[str]:
+        return [self.binary, 'list', '-Hp', '-t', 'filesystem,snapshot',
+                '-o', 'name,creation', '-r', self.dataset]
+
+    def list(self) -> Command:
+        """
+        Stream lines of tab-separated `name`, `creation` pairs.
+        """
+        return Command(self.argv(), self.timeout)
+
+
+class ZFSIndex:
+    """
+    Agents (by UUID) and their snapshots' (name, epoch) pairs, in creation
+    order. Built once and shared, rather than listing the pool per agent.
+
+    A `partial` index leaves some existing snapshots out on purpose, so they
+    mustn't be taken as destroyed (e.g. evicted from the cache).
+    """
+    def __init__(self, agents: List[str],
+                       snapshots: Dict[str, List[Tuple[str, int]]],
+                       partial: bool =False) -> None:
+        self.agents = agents
+        self.snapshots = snapshots
+        self.partial = partial
+
+    @staticmethod
+    def epoch(snap: str, creation: int) -> int:
+        """
+        Snapshots are named by their epoch; fall back on the creation time for
+        any that aren't.
+        """
+        return int(snap) if snap.isdigit() else creation
+
+    @classmethod
+    def load(cls, provider: Optional[ZFSProvider] =None) -> 'ZFSIndex':
+        """
+        Build the index from a single `zfs list`.
+        """
+        provider = provider or ZFSProvider()
+        with provider.list() as lines:
+            return cls.parse(lines, provider.dataset)
+
+    @classmethod
+    def parse(cls, lines: Iterable[str],
+                   dataset: str =agentDataset) -> 'ZFSIndex':
+        """
+        Build the index from `zfs list -Hp -o name,creation` output.
+        """
+        prefix = dataset.rstrip('/') + '/'
+        agents = []  # type: List[str]
+        snapshots = {}  # type: Dict[str, List[Tuple[int, str, int]]]
+
+        for line in lines:
+            name, _, creation = line.partition('\t')
+            if not name.startswith(prefix):
+                continue
+            name = name[len(prefix):]
+
+            if '@' in name:
+                uuid, _, snap = name.partition('@')
+                created = int(creation) if creation.isdigit() else 0
+                snapshots.setdefault(uuid, []).append(
+                    (created, snap, cls.epoch(snap, created))
+                )
+            else:
+                agents.append(name)
+                snapshots.setdefault(name, [])
+
+        return cls(agents, {
+            uuid: [(snap, epoch) for _, snap, epoch in
+                   sorted(snaps, key=lambda snap: snap[0])]
+            for uuid, snaps in snapshots.items()
+        })
+
+    @classmethod
+    def fromSnapshotDirectories(cls, uuids: List[str]) -> 'ZFSIndex':
+        """
+        Build an index for `uuids` from their `.zfs/snapshot` directories
+        instead, using snapshot mtimes as creation times.
+        """
+        snapshots = {}  # type: Dict[str, List[Tuple[str, int]]]
+
+        for uuid in uuids:
+            directory = agentMountpoint + uuid + '/.zfs/snapshot/'
+            snaps = []
+            for snap in os.listdir(directory):
+                created = int(snap) if snap.isdigit() \
+                    else int(os.stat(directory + snap).st_mtime)
+                snaps.append((created, snap))
+            snapshots[uuid] = [(snap, cls.epoch(snap, created))
+                               for created, snap in sorted(snaps)]
+
+        return cls(list(uuids), snapshots)
+
+    def after(self, watermarks: Dict[str, Optional[int]]) -> 'ZFSIndex':
+        """
+        A partial index of only those snapshots newer than their agent's
+        watermark epoch (all of them, where that's None).
+        """
+        snapshots = {}  # type: Dict[str, List[Tuple[str, int]]]
+
+        for uuid, snaps in self.snapshots.items():
+            watermark = watermarks.get(uuid)
+            snapshots[uuid] = snaps if watermark is None else \
+                [(snap, epoch) for snap, epoch in snaps if epoch > watermark]
+
+        return ZFSIndex(self.agents, snapshots, partial=True)
+
+    def between(self, since: Optional[int] =None, until: Optional[int] =None,
+                      last: Optional[int] =None) -> 'ZFSIndex':
+        """
+        A partial index of each agent's snapshots from epochs `since` through
+        `until`, inclusive, and then only the `last` of those.
+        """
+        snapshots = {}  # type: Dict[str, List[Tuple[str, int]]]
+
+        for uuid, snaps in self.snapshots.items():
+            snaps = [(snap, epoch) for snap, epoch in snaps
+                     if (since is None or epoch >= since)
+                     and (until is None or epoch <= until)]
+            if last is not None:
+                snaps = newest(snaps, last)
+            snapshots[uuid] = snaps
+
+        return ZFSIndex(self.agents, snapshots, partial=True)
+
+
+class Watermark:
+    """
+    The newest snapshot epoch already reported for an agent, for
+    `--since-last-run`, kept next to its `SnapshotCache`.
+    """
+    def __init__(self, uuid: str, directory: Optional[str] =None) -> None:
+        self.uuid = uuid
+        self.path = os.path.join(directory or cacheDirectory,
+                                 uuid + '.watermark')
+
+    def load(self) -> Optional[int]:
+        """
+        Read the watermark, or None if there isn't a valid one.
+        """
+        try:
+            with open(self.path) as watermarkFile:
+                return int(watermarkFile.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def advance(self, epoch: int) -> None:
+        """
+        Atomically replace the watermark with `epoch`, if that's newer.
+        """
+        current = self.load()
+        if current is not None and epoch <= current:
+            return
+
+        temporary = self.path + '.{}.tmp'.format(os.getpid())
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temporary, 'w') as watermarkFile:
+                watermarkFile.write('{}\n'.format(epoch))
+            os.replace(temporary, self.path)
+        except OSError as err:
+            print('WARNING: Could not write watermark {}: {}'
+                  .format(self.path, err), file=sys.stderr)
+
+
+class VolumeStore:
+    """
+    A SQLite database of every agent's per-snapshot volume usage, for `--store`
+    and `--query`. Snapshots are recorded whether or not they have an
+    agentInfo file, so none are parsed twice; volumes keep their order within
+    each snapshot, so tables come out as they would from `getInfo`.
+    """
+
+    # Snapshots to insert per transaction.
+    batchSize = 512
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS snapshots (
+            agent TEXT NOT NULL,
+            snapshot TEXT NOT NULL,
+            epoch INTEGER NOT NULL,
+            info INTEGER NOT NULL,
+            PRIMARY KEY (agent, snapshot)
+        );
+        CREATE INDEX IF NOT EXISTS snapshotsByEpoch ON snapshots (agent, epoch);
+        CREATE TABLE IF NOT EXISTS volumes (
+            agent TEXT NOT NULL,
+            snapshot TEXT NOT NULL,
+            epoch INTEGER NOT NULL,
+            volume TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            used INTEGER NOT NULL,
+            capacity INTEGER NOT NULL,
+            PRIMARY KEY (agent, snapshot, volume)
+        );
+        CREATE INDEX IF NOT EXISTS volumesByEpoch ON volumes (agent, epoch);
+        CREATE INDEX IF NOT EXISTS volumesByVolume ON volumes (volume, epoch);
+    '''
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(self.schema)
+
+    def agents(self) -> List[str]:
+        return [agent for agent, in self.connection.execute(
+            'SELECT DISTINCT agent FROM snapshots ORDER BY agent'
+        )]
+
+    def stored(self, uuid: str) -> set:
+        """
+        Names of the agent's snapshots that are already stored.
+        """
+        return set(snap for snap, in self.connection.execute(
+            'SELECT snapshot FROM snapshots WHERE agent = ?', (uuid,)
+        ))
+
+    def insert(self, uuid: str,
+                     snapshots: List[Tuple[str, int,
+                                           Optional[Dict[str, Dict[str, int]]]]]) \
+            -> None:
+        """
+        Upsert (snapshot, epoch, volumes or None) triples in one transaction.
+        """
+        snapRows = []  # type: List[Tuple[str, str, int, int]]
+        volumeRows = []  # type: List[Tuple[str, str, int, str, int, int, int]]
+
+        for snap, epoch, volumes in snapshots:
+            rows = [(uuid, snap, epoch, volume, position,
+                     usage['used'], usage['capacity'])
+                    for position, (volume, usage)
+                    in enumerate((volumes or {}).items())]
+
+            if any(not 0 <= value < 2 ** 63
+                   for row in rows for value in row[5:]):
+                # Outside SQLite's signed 64-bit INTEGER range (or negative,
+                # which no volume should be); left out to be parsed again.
+                continue
+
+            snapRows.append((uuid, snap, epoch, volumes is not None))
+            volumeRows += rows
+
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)',
+                snapRows
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO volumes VALUES (?, ?, ?, ?, ?, ?, ?)',
+                volumeRows
+            )
+
+    def history(self, uuid: str, since: Optional[int] =None,
+                      until: Optional[int] =None,
+                      last: Optional[int] =None,
+                      collapse: bool =False) -> 'VolumeHistory':
+        """
+        An agent's stored snapshots from `since` through `until`, and then
+        only the `last` of those, in epoch order; as `getInfo` returns them.
+        """
+        snaps = self.connection.execute(
+            'SELECT snapshot, epoch FROM snapshots '
+            'WHERE agent = ? AND info AND epoch BETWEEN ? AND ? '
+            'ORDER BY epoch DESC, snapshot DESC LIMIT ?',
+            (uuid, -2 ** 63 if since is None else since,
+             2 ** 63 - 1 if until is None else until,
+             -1 if last is None else last)
+        ).fetchall()
+        snaps.reverse()
+
+        history = VolumeHistory(collapse)
+        if not snaps:
+            return history
+
+        volumes = {}  # type: Dict[str, Dict[str, Dict[str, int]]]
+        for snap, volume, used, capacity in self.connection.execute(
+                'SELECT snapshot, volume, used, capacity FROM volumes '
+                'WHERE agent = ? AND epoch BETWEEN ? AND ? '
+                'ORDER BY epoch, snapshot, position',
+                (uuid, snaps[0][1], snaps[-1][1])):
+            volumes.setdefault(snap, {})[volume] = \
+                {'capacity': capacity, 'used': used}
+
+        for snap, epoch in snaps:
+            history.append(epoch, volumes.get(snap, {}))
+
+        return history
+
+    def __enter__(self) -> 'VolumeStore':
+        return self
+
+    def __exit__(self, *args: Any) -> Any:
+        self.connection.close()
+
+
+class VolumeServer:
+    """
+    Agents' decoded histories, kept in memory for `--serve`; at most
+    `capacity` of them, dropping the least recently used. Polling is cheap:
+    an agent is only re-read (through `getInfo`, so just its new snapshots
+    are parsed) once its `.zfs/snapshot` directory's mtime changes, and the
+    list of agents once the agents' mountpoint's does.
+
+    Requests and responses are JSON objects, one per line, over a Unix socket:
+
+        {"op": "agents"}
+        {"op": "latest", "agent": "<uuid>"}
+        {"op": "history", "agent": "<uuid>", "since": 1546000000, "last": 10}
+        {"op": "forecast", "agent": "<uuid>"}
+
+    `since`, `until` and `last` are optional, as with the command line. E.g.
+
+        $ echo '{"op": "latest", "agent": "<uuid>"}' | socat - UNIX:<socket>
+
+    Each client gets its own thread, so one that stays connected doesn't hold
+    up the rest, but requests are answered one at a time, under `lock`.
+    """
+    def __init__(self, capacity: int =64, cache: bool =True,
+                       jobs: int =1) -> None:
+        self.capacity = capacity
+        self.cache = cache
+        self.jobs = jobs
+        self.histories = OrderedDict()  # type: OrderedDict
+        self.lock = threading.Lock()
+        self.agentList = []  # type: List[str]
+        self.agentStamp = None  # type: Optional[int]
+
+    def agents(self) -> List[str]:
+        """
+        Agents with snapshot directories, re-listed only if that's changed.
+        """
+        stamp = os.stat(agentMountpoint).st_mtime_ns
+
+        if stamp != self.agentStamp:
+            self.agentList = sorted(
+                entry for entry in os.listdir(agentMountpoint)
+                if os.path.isdir(agentMountpoint + entry + '/.zfs/snapshot')
+            )
+            self.agentStamp = stamp
+
+        return self.agentList
+
+    def history(self, uuid: str) -> 'VolumeHistory':
+        """
+        An agent's history, from memory unless its snapshots have changed.
+        """
+        if uuid not in self.agents():
+            raise KeyError('No such agent: {}'.format(uuid))
+
+        # Taken before listing, so a change midway is caught next time.
+        stamp = os.stat(agentMountpoint + uuid + '/.zfs/snapshot').st_mtime_ns
+
+        entry = self.histories.get(uuid)
+        if entry is None or entry[0] != stamp:
+            index = ZFSIndex.fromSnapshotDirectories([uuid])
+            history, = getInfo([uuid], index, cache=self.cache, jobs=self.jobs)
+            entry = self.histories[uuid] = (stamp, history)
+
+            while len(self.histories) > self.capacity:
+                self.histories.popitem(last=False)
+
+        self.histories.move_to_end(uuid)
+        return entry[1]
+
+    def respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Answer one request.
+        """
+        op = request.get('op')
+
+        if op == 'agents':
+            return {'agents': self.agents()}
+        elif op not in ('latest', 'history', 'forecast'):
+            raise ValueError('Unknown op: {}'.format(op))
+
+        uuid = request.get('agent')
+        if not isinstance(uuid, str):
+            raise ValueError('agent must be a UUID, received {!r}'.format(uuid))
+
+        # `timings` would otherwise gain a phase per agent for good; with
+        # --timings, what's reported is the last request.
+        timings.phases.clear()
+        timings.profiles.clear()
+
+        history = self.history(uuid)
+
+        if op == 'latest':
+            if not len(history):
+                return {'agent': uuid, 'epoch': None, 'volumes': {}}
+            return {'agent': uuid, 'epoch': history.epochs[-1],
+                    'volumes': history.snapshot(len(history) - 1)}
+        elif op == 'forecast':
+            return {'agent': uuid, 'volumes': {
+                volume: {'used': used, 'capacity': capacity, 'epoch': epoch,
+                         'bytesPerDay': rate, 'full': full}
+                for full, _, volume, used, capacity, epoch, rate
+                in forecast([uuid], [history])
+            }}
+
+        since, until, last = \
+            request.get('since'), request.get('until'), request.get('last')
+
+        for name, value in (('since', since), ('until', until), ('last', last)):
+            if value is not None and \
+                    (type(value) is not int or name == 'last' and value < 1):
+                raise ValueError('{} must be {}, received {!r}'.format(
+                    name, 'an integer of at least 1' if name == 'last'
+                    else 'an epoch', value
+                ))
+
+        snapshots = [i for i, epoch in enumerate(history.epochs)
+                     if (since is None or epoch >= since)
+                     and (until is None or epoch <= until)]
+        if last is not None:
+            snapshots = newest(snapshots, last)
+
+        return {'agent': uuid, 'snapshots': [
+            {'epoch': history.epochs[i], 'volumes': history.snapshot(i)}
+            for i in snapshots
+        ]}
+
+    def serve(self, path: str) -> None:
+        """
+        Answer requests on a Unix socket at `path` until interrupted.
+        """
+        if os.path.exists(path):
+            # Left behind by a server that didn't exit cleanly.
+            os.unlink(path)
+
+        server = socketserver.ThreadingUnixStreamServer(path,
+                                                        VolumeRequestHandler)
+        server.daemon_threads = True
+        server.volumes = self  # type: ignore
+
+        def stop(*args: Any) -> None:
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, stop)
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.unlink(path)
+
+
+class VolumeRequestHandler(socketserver.StreamRequestHandler):
     """
-    Log this script's usage/arguments.
+    One client of a `VolumeServer`; any number of requests, a line apiece.
     """
-    with getIO('lsb_release -r') as lsbOutput:
-        lsbOut = lsbOutput[0]
+    def handle(self) -> None:
+        volumes = self.server.volumes  # type: ignore
 
-    if '16.04' in lsbOut:
-        with open('/datto/config/deviceID') as devID:
-            deviceID = devID.read().strip()
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode())
+                if not isinstance(request, dict):
+                    raise ValueError('Expected an object')
+                with volumes.lock:
+                    response = volumes.respond(request)
+            except (ValueError, KeyError, TypeError, OSError) as err:
+                response = {'error': '{}: {}'.format(type(err).__name__, err)}
+
+            self.wfile.write((json.dumps(response) + '\n').encode())
+            self.wfile.flush()
+
+
+class VolumeHistory:
+    """
+    One agent's snapshot history, stored by column rather than as a dict of
+    dicts per snapshot: an array of epochs and, per volume (names interned
+    once, in order of first appearance), arrays of `used` and `capacity` bytes
+    indexed by snapshot. Volumes that are added or removed along the way have
+    their `present` flag cleared in the snapshots they're missing from.
+
+    With `collapse`, runs of consecutive snapshots with identical volumes are
+    stored once, as their first snapshot; `runs` counts the snapshots in each
+    row and `lastEpochs` holds the epoch of each row's last snapshot.
+    """
+    def __init__(self, collapse: bool =False) -> None:
+        self.collapse = collapse
+        self.epochs = array('q')
+        self.runs = array('I')
+        self.lastEpochs = array('q')
+        self.volumes = []  # type: List[str]
+        self.columns = {}  # type: Dict[str, int]
+        self.used = []  # type: List[array]
+        self.capacity = []  # type: List[array]
+        self.present = []  # type: List[bytearray]
+        self.previous = None  # type: Optional[Dict[str, Dict[str, int]]]
+
+    @classmethod
+    def fromSnapshots(cls, snaps: Iterable[Tuple[int, Dict[str, Dict[str, int]]]],
+                      collapse: bool =False) -> 'VolumeHistory':
+        history = cls(collapse)
+        for epoch, volumes in snaps:
+            history.append(epoch, volumes)
+        return history
+
+    def __len__(self) -> int:
+        return len(self.epochs)
+
+    def append(self, epoch: int, volumes: Dict[str, Dict[str, int]]) -> None:
+        """
+        Add the next snapshot's volumes.
+        """
+        if self.collapse:
+            if volumes == self.previous:
+                self.runs[-1] += 1
+                self.lastEpochs[-1] = epoch
+                return
+            self.previous = volumes
+
+        n = len(self.epochs)
+        self.epochs.append(epoch)
+        self.runs.append(1)
+        self.lastEpochs.append(epoch)
+
+        for used, capacity, present in zip(self.used, self.capacity,
+                                           self.present):
+            used.append(0)
+            capacity.append(0)
+            present.append(0)
+
+        for volume, usage in volumes.items():
+            column = self.columns.get(volume)
+            if column is None:
+                column = self.columns[volume] = len(self.volumes)
+                self.volumes.append(sys.intern(volume))
+                self.used.append(array('Q', [0]) * (n + 1))
+                self.capacity.append(array('Q', [0]) * (n + 1))
+                self.present.append(bytearray(n + 1))
+            self.used[column][n] = int(usage['used'])
+            self.capacity[column][n] = int(usage['capacity'])
+            self.present[column][n] = 1
+
+    def snapshot(self, i: int) -> Dict[str, Dict[str, int]]:
+        """
+        The `i`th snapshot's volumes, as `linux` or `windows` returned them.
+        """
+        return {
+            volume: {'capacity': self.capacity[column][i],
+                     'used': self.used[column][i]}
+            for column, volume in enumerate(self.volumes)
+            if self.present[column][i]
+        }
+
+    def __iter__(self) -> Iterator[Tuple[int, Dict[str, Dict[str, int]]]]:
+        for i, epoch in enumerate(self.epochs):
+            yield epoch, self.snapshot(i)
+
+    def trend(self, column: int) -> Optional[Tuple[float, Optional[int]]]:
+        """
+        Fit a least-squares line through a volume's `used` bytes over the
+        snapshots it's in, in one pass over its columns, returning its growth
+        in bytes per day and the epoch at which the line reaches the volume's
+        latest capacity (None if it isn't growing). None if there aren't two
+        distinct snapshots to fit.
+        """
+        present = self.present[column]
+        first, last = present.find(1), present.rfind(1)
+        if first < 0:
+            return None
+
+        # Days since the volume's first snapshot keep the sums well-scaled.
+        origin = self.epochs[first]
+        n = 0
+        sx = sy = sxx = sxy = 0.0
+
+        for epoch, used, here in zip(self.epochs, self.used[column], present):
+            if here:
+                x = (epoch - origin) / 86400
+                n += 1
+                sx += x
+                sy += used
+                sxx += x * x
+                sxy += x * used
+
+        denominator = n * sxx - sx * sx
+        if n < 2 or denominator <= 0:
+            return None
+
+        slope = (n * sxy - sx * sy) / denominator
+        intercept = (sy - slope * sx) / n
+
+        if slope <= 0:
+            return slope, None
+
+        full = (self.capacity[column][last] - intercept) / slope
+        return slope, int(origin + full * 86400)
+
+
+class PresentNiceColumns:
+    """
+    Present the information in straight columns; this is probably my least
+    favorite part of this script :/ So ugly.
+    """
+
+    # Write to `out` (default stdout) in chunks of roughly this many characters.
+    bufferSize = 1 << 16
+
+    def __init__(self,
+                 allSnaps: List['VolumeHistory'],
+                 uuids: List[str],
+                 binary: bool =True,
+                 noscale: bool =False,
+                 color: bool =True,
+                 localtime: bool  =False,
+                 out: Optional[TextIO] =None) -> None:
+        self.allSnaps = allSnaps
+        self.uuids = uuids
+        self.binary = binary
+        self.fixes = ['B '] + [fix + ('i' if self.binary else 'B')
+                      for fix in ['K', 'M', 'G', 'T', 'P', 'E', 'Z', 'Y']]
+        self.divisors = [2 ** (10 * magnitude) if self.binary
+                         else 10 ** (3 * magnitude)
+                         for magnitude in range(len(self.fixes))]
+        self.noscale = noscale
+        self.color = color
+        self.localtime = localtime
+        self.out = out
+
+        self.bold, self.red, self.reset = \
+            Color.bold().color, Color.red().color, Color.normal().color
+
+    def render(self) -> None:
+        """
+        Print these agents' snapshots in nice visual columns.
+        """
+        for uuid, history in zip(self.uuids, self.allSnaps):
+            if len(history) == 0:
+                self._missing(uuid)
+                continue
+
+            # Format each volume's columns in one pass over its arrays.
+            columns = [self._columns(history, column)
+                       for column in range(len(history.volumes))]
+
+            # Get column widths for this agent prior to presentation.
+            colWidths = []  # type: List[int]
+            for volume in columns:
+                colWidths += [max(map(len, cells)) for cells in volume]
+
+            self._emit(self._lines(history, columns, colWidths))
+
+    def _columns(self, history: VolumeHistory, column: int) -> List[List[str]]:
+        """
+        One volume's name, used, capacity and percent used cells for every
+        snapshot; blank where the volume is missing.
+        """
+        used = history.used[column]
+        capacity = history.capacity[column]
+        present = history.present[column]
+
+        def scaled(values: array) -> List[str]:
+            # Sizes rarely change between snapshots (capacity almost never),
+            # so each distinct value is only formatted once.
+            distinct = list(set(value for value, here in zip(values, present)
+                                if here))
+            if self.noscale:
+                formatted = dict(zip(distinct, map(str, distinct)))
+            else:
+                formatted = dict(zip(distinct, self.scaleColumn(distinct)))
+            return [formatted[value] if here else ''
+                    for value, here in zip(values, present)]
+
+        name = history.volumes[column] + '-'
+
+        return [
+            [name if here else '' for here in present],
+            scaled(used),
+            scaled(capacity),
+            ['{0:.1f}%'.format(100 * _used / _capacity) if here else ''
+             for _used, _capacity, here in zip(used, capacity, present)]
+        ]
+
+    def _lines(self, history: VolumeHistory, columns: List[List[List[str]]],
+                     colWidths: List[int]) -> Iterator[str]:
+        """
+        Lay out `render`'s rows from its formatted columns. A volume missing
+        from a snapshot leaves a blank gap, unless no later volume is there.
+        """
+        for i, epoch in enumerate(history.epochs):
+            row = []  # type: List[str]
+            end = 0
+            for column, volume in enumerate(columns):
+                row += [cells[i] for cells in volume]
+                if history.present[column][i]:
+                    end = len(row)
+            yield self._line(epoch, row[:end], colWidths,
+                             self._note(history.runs[i], epoch,
+                                        history.lastEpochs[i]))
+
+    def renderStream(self, uuid: str,
+                     snapshots: Iterable[Tuple[int, Dict[str, Dict[str, int]]]],
+                     window: int =256, collapse: bool =False) -> None:
+        """
+        Print one agent's snapshots as they arrive, holding no more than
+        `window` of them at a time. Column widths come from that first window
+        of snapshots and only ever grow afterwards, so the table is identical
+        to `render`'s unless a later snapshot needs a wider column. With
+        `collapse`, runs of identical snapshots are printed once.
+        """
+        if collapse:
+            runs = collapseRuns(snapshots)
+        else:
+            runs = ((epoch, snap, 1, epoch) for epoch, snap in snapshots)
+
+        # Volumes' places in the row, in order of first appearance.
+        places = {}  # type: Dict[str, int]
+
+        head = [(epoch, self._cells(snap, places),
+                 self._note(count, epoch, last))
+                for epoch, snap, count, last in islice(runs, window)]
+
+        if not head:
+            self._missing(uuid)
+            return
+
+        colWidths = []  # type: List[int]
+        for _, row, _ in head:
+            self._widen(colWidths, row)
+
+        def lines() -> Iterator[str]:
+            for epoch, row, note in head:
+                yield self._line(epoch, row, colWidths, note)
+            head.clear()
+            for epoch, snap, count, last in runs:
+                row = self._cells(snap, places)
+                self._widen(colWidths, row)
+                yield self._line(epoch, row, colWidths,
+                                 self._note(count, epoch, last))
+
+        self._emit(lines())
+
+    def _note(self, count: int, first: int, last: int) -> str:
+        """
+        Annotate a row standing in for a run of `count` identical snapshots.
+        """
+        if count == 1:
+            return ''
+        return ' x{}, {} - {}'.format(count, time(first, self.localtime),
+                                      time(last, self.localtime))
+
+    def renderSummary(self, rows: Iterable[Tuple[float, str, str, int, int,
+                                                 int, Optional[int]]]) -> None:
+        """
+        Print `summarizeAgents`' rows, one line per agent and volume, in the
+        order given.
+        """
+        table = []  # type: List[Tuple[int, List[str]]]
+
+        for percent, uuid, volume, used, capacity, epoch, change in rows:
+            if self.noscale:
+                cells = [str(used), str(capacity)]
+            else:
+                cells = self.scaleColumn((used, capacity))
+
+            row = [uuid, volume + '-'] + cells + ['{0:.1f}%'.format(percent)]
+
+            if change is not None:
+                sign = '-' if change < 0 else '+'
+                row.append(sign + (str(abs(change)) if self.noscale
+                                   else self.scale(abs(change))))
+
+            table.append((epoch, row))
+
+        self._emit(self._summaryLines(table))
+
+    def renderForecast(self, rows: Iterable[Tuple[Optional[int], str, str,
+                                                  int, int, int, float]]) \
+            -> None:
+        """
+        Print `forecast`'s rows, one line per agent and volume, in the order
+        given: latest figures, growth per day and projected date full.
+        """
+        table = []  # type: List[Tuple[int, List[str]]]
+
+        for full, uuid, volume, used, capacity, epoch, rate in rows:
+            # Whole bytes, so a tiny shrink isn't shown as -0.
+            rate = round(rate)
+
+            if self.noscale:
+                cells = [str(used), str(capacity)]
+                growth = str(abs(rate))
+            else:
+                cells = self.scaleColumn((used, capacity))
+                growth = self.scale(abs(rate))
+
+            if rate:
+                growth = ('-' if rate < 0 else '+') + growth
+            else:
+                growth = '0'
+
+            table.append((epoch, [
+                uuid, volume + '-'] + cells + [
+                '{0:.1f}%'.format(100 * used / capacity if capacity else 0.0),
+                growth + '/day',
+                'full ' + time(full, self.localtime) if full is not None
+                else 'not filling' if rate > 0 else 'not growing'
+            ]))
+
+        self._emit(self._summaryLines(table))
+
+    def _summaryLines(self, table: List[Tuple[int, List[str]]]) \
+            -> Iterator[str]:
+        """
+        Lay out rows of a uuid, volume name and further cells, each following
+        the epoch of the snapshot it describes.
+        """
+        colWidths = []  # type: List[int]
+        for _, row in table:
+            self._widen(colWidths, row)
+
+        def lines() -> Iterator[str]:
+            for epoch, row in table:
+                stamp = time(epoch, self.localtime) + ' ~ '
+                uuid, volume = row[0].ljust(colWidths[0]) + '  ', \
+                    row[1].rjust(colWidths[1]) + ' '
+                if self.color:
+                    stamp = self.bold + stamp + self.reset
+                    volume = self.red + volume + self.reset
+                yield ''.join(
+                    [stamp, uuid, volume] + [
+                        cell.rjust(colWidths[i]) + ' '
+                        for i, cell in enumerate(row[2:], 2)
+                    ] + ['\n']
+                )
+
+        return lines()
+
+    def _missing(self, uuid: str) -> None:
+        (self.out or sys.stdout).write(
+            self.red + self.bold + '** ERROR: no snapshots for {}\n'
+            .format(uuid) + self.reset + self.reset
+        )
+
+    def _cells(self, snap: Dict[str, Dict[str, int]],
+                     places: Dict[str, int]) -> List[str]:
+        """
+        Format one snapshot as a flat list of columns, four per volume: name,
+        used, capacity and percent used. Each volume goes in its place from
+        `places`, which new volumes are added to, leaving blanks for missing
+        ones as `render` does.
+        """
+        for volume in snap:
+            places.setdefault(volume, len(places))
+
+        cells = [''] * (4 * (max(places[volume] for volume in snap) + 1)
+                        if snap else 0)
+
+        for volume in snap:
+            _used = snap[volume]['used']
+            _capacity = snap[volume]['capacity']
+            if self.noscale:
+                used = str(_used)
+                capacity = str(_capacity)
+            else:
+                used, capacity = self.scaleColumn((_used, _capacity))
+
+            place = 4 * places[volume]
+            cells[place:place + 4] = [
+                volume + '-', used, capacity,
+                '{0:.1f}%'.format(100 * _used / _capacity)
+            ]
+
+        return cells
+
+    @staticmethod
+    def _widen(colWidths: List[int], row: List[str]) -> None:
+        """
+        Grow `colWidths`, in place, to fit `row`.
+        """
+        # Auto-expand if disks were added somewhere along the line.
+        if len(row) > len(colWidths):
+            colWidths += [0] * (len(row) - len(colWidths))
+
+        for i, column in enumerate(row):
+            width = len(column)
+            if colWidths[i] < width:
+                colWidths[i] = width
+
+    def _line(self, epoch: int, row: List[str], colWidths: List[int],
+                    note: str ='') -> str:
+        """
+        Lay out one snapshot's row with proper widths, escape codes inlined,
+        followed by `note`.
+        """
+        # The converted epoch time.
+        stamp = time(epoch, self.localtime) + ' ~ '
+        line = [self.bold + stamp + self.reset if self.color else stamp]
+
+        for i, column in enumerate(row):
+            cell = column.rjust(colWidths[i]) + ' '
+            if i % 4 == 0:
+                if i != 0:
+                    line.append(' ')
+                if self.color:
+                    cell = self.red + cell + self.reset
+            line.append(cell)
+
+        if note:
+            line.append(self.bold + note + self.reset if self.color else note)
+
+        line.append('\n')
+
+        return ''.join(line)
+
+    def _emit(self, lines: Iterable[str]) -> None:
+        """
+        Write lines to the terminal through a buffer, in large chunks rather
+        than a write per cell.
+        """
+        out = self.out or sys.stdout
+        buffered = []  # type: List[str]
+        size = 0
 
-        # The following is None if you're directly SSH'ed into the 
-        # appliance, so we need to compensate for that somehow I'd think
-        # to avoid a `TypeError` here.
-        dasUser = os.environ.get('DAS_USER')
-        if not dasUser:
-            dasUser = 'localSSH'
+        for line in lines:
+            buffered.append(line)
+            size += len(line)
 
-        if __file__ != 'basicVolumeInfo.py':
-            scriptName = __file__ + '_basicVolumeInfo.py'
+            if size >= self.bufferSize:
+                out.write(''.join(buffered))
+                buffered, size = [], 0
+
+        out.write(''.join(buffered))
+        out.flush()
+
+    def scale(self, bts: int) -> str:
+        """
+        Format volume used/capacity values to the correct binary or metric
+        magnitude (and hence prefix).
+        """
+        return self.scaleColumn((bts,))[0]
+
+    def scaleColumn(self, column: Iterable[int]) -> List[str]:
+        """
+        `scale` a whole column of byte counts at once.
+        """
+        return ['{0:.2f}{1}'.format(value, prefix)
+                for value, prefix in self.magnitudes(column)]
+
+    def magnitudes(self, column: Iterable[int]) -> List[Tuple[float, str]]:
+        """
+        Scale a column of byte counts to (value, prefix) pairs. Magnitudes are
+        picked from bit lengths (binary) or a table of thresholds (metric);
+        anything past the largest prefix is just expressed in that prefix.
+        """
+        fixes, divisors = self.fixes, self.divisors
+        top = len(fixes) - 1
+        zero = (0.0, ' Ki' if self.binary else ' KB')
+        pairs = []  # type: List[Tuple[float, str]]
+
+        for bts in column:
+            if bts <= 0:
+                if bts < 0:
+                    raise ValueError('Expected value >=0, received {}'
+                                     .format(bts))
+                pairs.append(zero)
+                continue
+
+            if self.binary:
+                magnitude = (bts.bit_length() - 1) // 10
+            else:
+                magnitude = bisect_right(divisors, bts) - 1
+
+            if magnitude > top:
+                magnitude = top
+
+            pairs.append((bts / divisors[magnitude], fixes[magnitude]))
+
+        return pairs
+
+
+def osVersion(path: str ='/etc/os-release') -> str:
+    """
+    This OS's `VERSION_ID` (e.g. '16.04'), without running `lsb_release`.
+    """
+    try:
+        with open(path) as release:
+            for line in release:
+                key, _, value = line.strip().partition('=')
+                if key == 'VERSION_ID':
+                    return value.strip('"\'')
+    except OSError:
+        pass
+
+    return ''
+
+
+class PresentRecords:
+    """
+    Write snapshots out as machine-readable records, one per agent, snapshot
+    and volume, in JSON Lines, CSV or TSV (with a header row). There's nothing
+    to measure or color, unlike `PresentNiceColumns`, so each snapshot's
+    records are written out as soon as it's read.
+    """
+
+    forms = ['jsonl', 'csv', 'tsv']
+    fields = ['agent', 'epoch', 'volume', 'used', 'capacity']
+
+    def __init__(self, form: str ='jsonl', out: Optional[TextIO] =None) -> None:
+        if form not in self.forms:
+            raise ValueError('Unknown format: {}'.format(form))
+        self.form = form
+        self.out = out or sys.stdout
+        self.header = form == 'jsonl'
+
+    def write(self, uuid: str,
+                    snapshots: Iterable[Tuple[int, Dict[str, Dict[str, int]]]]) \
+            -> None:
+        """
+        Write one agent's (epoch, volumes) pairs.
+        """
+        out = self.out
+
+        if self.form == 'jsonl':
+            for epoch, volumes in snapshots:
+                out.write(''.join(
+                    json.dumps({'agent': uuid, 'epoch': epoch,
+                                'volume': volume, 'used': usage['used'],
+                                'capacity': usage['capacity']}) + '\n'
+                    for volume, usage in volumes.items()
+                ))
         else:
-            scriptName = 'basicVolumeInfo.py'
+            writer = csv.writer(out, lineterminator='\n',
+                dialect='excel-tab' if self.form == 'tsv' else 'excel')
+
+            if not self.header:
+                writer.writerow(self.fields)
+                self.header = True
+
+            for epoch, volumes in snapshots:
+                writer.writerows(
+                    (uuid, epoch, volume, usage['used'], usage['capacity'])
+                    for volume, usage in volumes.items()
+                )
+
+        out.flush()
 
-        arguments = ' '.join(sys.argv[1:])
 
-        # Submit this data.
-        getIO('curl -sS -X POST -F deviceID={0} -F dasUser={1} -F script={2}' 
-              '-F arguments={3} https://supportfiles.datto.com/api/script/log'\
-              .format(deviceID, dasUser, scriptName, arguments))
+def scriptLog(url: Optional[str] =None,
+              timeout: float =10.0) -> Optional[threading.Thread]:
+    """
+    Log this script's usage/arguments. The entry is spooled to a file, then
+    submitted, with any earlier ones that couldn't be, from a background
+    thread (returned, though nothing needs to wait on it: whatever is still
+    unsent when we exit is sent by the next run).
+    """
+    version = osVersion()
+
+    if version == '16.04':
+        spoolLog()
+        thread = threading.Thread(
+            target=submitLogs, args=(url or logURL, timeout), daemon=True
+        )
+        thread.start()
+        return thread
     else:
         print('WARNING: OS version is not 16.04. '
-              'Skipping logging; received \'{0}\''.format(*lsbOutput))
+              'Skipping logging; received \'{0}\''.format(version),
+              file=sys.stderr)
+        return None
 
 
-def main() -> None:
+def spoolLog() -> None:
     """
-    Get user input. Set up process.
+    Add this run's usage log to the spool under `cacheDirectory`, dropping the
+    oldest past `logSpoolSize`. Best-effort, like the submission.
     """
+    # The following is None if you're directly SSH'ed into the 
+    # appliance, so we need to compensate for that somehow I'd think
+    # to avoid a `TypeError` here.
+    dasUser = os.environ.get('DAS_USER')
+    if not dasUser:
+        dasUser = 'localSSH'
+
+    if __file__ != 'basicVolumeInfo.py':
+        scriptName = __file__ + '_basicVolumeInfo.py'
+    else:
+        scriptName = 'basicVolumeInfo.py'
+
+    arguments = ' '.join(sys.argv[1:])
+
+    spool = os.path.join(cacheDirectory, 'logs')
+    entry = os.path.join(spool, '{:.6f}-{}'.format(
+        datetime.now(timezone.utc).timestamp(), os.getpid()
+    ))
+
+    try:
+        os.makedirs(spool, exist_ok=True)
+        with open(entry + '.tmp', 'w') as entryFile:
+            json.dump({'dasUser': dasUser, 'script': scriptName,
+                       'arguments': arguments}, entryFile)
+        # So a concurrent run's submission never reads half an entry.
+        os.replace(entry + '.tmp', entry + '.json')
+
+        for stale in spooledLogs(spool)[:-logSpoolSize]:
+            os.unlink(stale)
+    except OSError:
+        pass
 
-    # Call this logging function for internal tracking.
-    scriptLog()
 
+def spooledLogs(spool: str) -> List[str]:
+    """
+    Paths of the usage logs in `spool`, oldest first.
+    """
+    try:
+        names = os.listdir(spool)
+    except OSError:
+        return []
+
+    return [os.path.join(spool, name) for name in sorted(names)
+            if name.endswith('.json')]
+
+
+def submitLogs(url: str, timeout: float =10.0) -> None:
+    """
+    POST each spooled usage log, oldest first, as a multipart form (as
+    `curl -F` would), removing it once it's been accepted. The first failure
+    leaves it and the rest for the next run.
+    """
+    # Imported here, off the main thread, as it's slow to import and only
+    # ever needed for this.
+    from urllib.request import Request, urlopen
+
+    try:
+        with open(deviceIDPath) as devID:
+            deviceID = devID.read().strip()
+
+        for path in spooledLogs(os.path.join(cacheDirectory, 'logs')):
+            with open(path) as entryFile:
+                entry = json.load(entryFile)
+
+            boundary = uuid4().hex
+            body = ''.join(
+                '--{}\r\nContent-Disposition: form-data; name="{}"\r\n\r\n{}\r\n'
+                .format(boundary, name, value)
+                for name, value in (('deviceID', deviceID),
+                                    ('dasUser', entry['dasUser']),
+                                    ('script', entry['script']),
+                                    ('arguments', entry['arguments']))
+            ) + '--{}--\r\n'.format(boundary)
+
+            request = Request(url, data=body.encode(), headers={
+                'Content-Type': 'multipart/form-data; boundary=' + boundary
+            })
+
+            with urlopen(request, timeout=timeout) as response:
+                response.read()
+
+            os.unlink(path)
+    except Exception:
+        # Network errors, bad responses (`http.client.HTTPException`), a
+        # missing device ID, an entry another run has just sent; none of it
+        # should surface from this thread.
+        pass
+
+
+def main() -> None:
+    """
+    Get user input. Set up process.
+    """
     parser = argparse.ArgumentParser(description=__doc__,
         formatter_class=argparse.RawDescriptionHelpFormatter)
 
@@ -644,41 +2891,397 @@ def main() -> None:
         help='Do not scale byte counts (for later processing/plotting).'
     )
 
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+        help='Parse uncached snapshots across this many processes (default: '
+             '1, or one per CPU with --async).'
+    )
+
+    # Cannot run all agents at once and stream them one at a time.
+    modeGroup = parser.add_mutually_exclusive_group()
+
+    modeGroup.add_argument('--async', dest='asynchronous', default=False,
+        action='store_true',
+        help='Parse all agents at once, printing each agent\'s table as soon '
+             'as it\'s ready (useful with many -a agents).'
+    )
+
+    modeGroup.add_argument('--all', type=int, nargs='?', const=1,
+        metavar='N',
+        help='Summarize every agent from its newest snapshot (or the change '
+             'over its newest N), one line per volume, fullest first.'
+    )
+
+    modeGroup.add_argument('--forecast', default=False, action='store_true',
+        help='Fit a trend to each volume\'s used bytes (within --since, '
+             '--until and --last) and show its growth per day and projected '
+             'date full, soonest first.'
+    )
+
+    modeGroup.add_argument('--serve', type=str, metavar='SOCKET',
+        help='Keep running, answering JSON queries on a Unix socket at SOCKET '
+             'from agents\' histories held in memory (see --lru).'
+    )
+
+    modeGroup.add_argument('--stream', default=False, action='store_true',
+        help='Stream snapshots from disk to the terminal in constant memory, '
+             'sizing columns from a window of them (see --window). Bypasses '
+             'the cache.'
+    )
+
+    parser.add_argument('--since-last-run', default=False, action='store_true',
+        help='Only show snapshots newer than those shown by the last run '
+             'with this flag, for each agent (e.g. from cron).'
+    )
+
+    parser.add_argument('--since', type=str, metavar='TIME',
+        help='Only show snapshots taken at or after TIME: an epoch, a date '
+             '(e.g. 2018-12-29 or "2018-12-29 13:30", in UTC unless '
+             '--localtime) or an age (e.g. 12h, 7d, 2w).'
+    )
+
+    parser.add_argument('--until', type=str, metavar='TIME',
+        help='Only show snapshots taken at or before TIME (as for --since).'
+    )
+
+    parser.add_argument('--last', type=int, metavar='N',
+        help='Only show each agent\'s newest N snapshots (within --since and '
+             '--until).'
+    )
+
+    parser.add_argument('--store', type=str, metavar='PATH',
+        help='Add newly seen snapshots to the SQLite database at PATH, and '
+             'show agents\' tables from it.'
+    )
+
+    parser.add_argument('--query', default=False, action='store_true',
+        help='Show agents\' tables (or --forecast) from the --store database '
+             'alone, without listing or reading any snapshots; every stored '
+             'agent unless -a is given.'
+    )
+
+    parser.add_argument('--top', type=int, metavar='K',
+        help='With --all, show only the K fullest volumes.'
+    )
+
+    parser.add_argument('--lru', type=int, default=64, metavar='N',
+        help='Agents\' histories to keep in memory with --serve.'
+    )
+
+    parser.add_argument('--format', default='table',
+        choices=['table'] + PresentRecords.forms,
+        help='Print tables, or one record per agent, snapshot and volume in '
+             'JSON Lines, CSV or TSV, as each snapshot is read (for '
+             'processing/plotting).'
+    )
+
+    parser.add_argument('--collapse', default=False, action='store_true',
+        help='Print runs of consecutive snapshots with identical volumes '
+             'once, noting how many and over what time.'
+    )
+
+    parser.add_argument('--window', type=int, default=256,
+        help='Snapshots to look ahead at for column widths with --stream.'
+    )
+
+    # Cannot skip the cache and rebuild it, either.
+    cacheGroup = parser.add_mutually_exclusive_group()
+
+    cacheGroup.add_argument('--no-cache', dest='cache', default=True,
+        action='store_false',
+        help='Neither read nor update the cache of parsed snapshots.'
+    )
+
+    cacheGroup.add_argument('--rebuild-cache', default=False,
+        action='store_true',
+        help='Re-parse every snapshot, replacing the cache of parsed snapshots.'
+    )
+
+    parser.add_argument('--timings', nargs='?', const='text',
+        choices=['text', 'json'],
+        help='Report wall and CPU time, counts and bytes read for each phase '
+             'of the run on stderr, as a table or as JSON.'
+    )
+
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE',
+        help='Profile the run and dump the slowest phase\'s stats to stderr, '
+             'or to FILE for `pstats`.'
+    )
+
+    parser.add_argument('--no-log', dest='log', default=True,
+        action='store_false',
+        help='Do not submit a usage log; nor will setting '
+             'BASICVOLUMEINFO_NO_LOG.'
+    )
+
     args = parser.parse_args()
 
-    # Just some basic control-flow to get an agent that actually exists.
-    with getIO('zfs list -Ho name | grep -oP "(?<=(agents\/))[^\s]+"') as agents:
-        if not agents:
-            raise InvalidAgentNumberError('No agents found: {}'.format(agents))
-        else:
-            if not args.agent:
-                # List agents by UUID, ask the user for input.
-                while True:
-                    print(*agents, sep='\n', end='\n\n')
-                    uuid = input('Agent: ')
-                    if uuid in agents:
-                        break
-                    else:
-                        with Color.red(), Color.bold():
-                            print('\n** ERROR: Please make a valid selection, '
-                                  'received \'{}\'\n'.format(uuid))
-                allSnaps = getInfo([uuid])
-                uuids = [uuid]
+    timings.profile = args.profile is not None
+
+    # Call this logging function for internal tracking.
+    if args.log and not os.environ.get('BASICVOLUMEINFO_NO_LOG'):
+        with timings.phase('scriptLog'):
+            scriptLog()
+
+    try:
+        run(args, parser)
+    finally:
+        if args.timings:
+            timings.report(args.timings)
+        if args.profile:
+            timings.dumpProfile(args.profile)
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    """
+    Carry out `main`'s parsed arguments.
+    """
+    if args.jobs is None:
+        args.jobs = (os.cpu_count() or 1) if args.asynchronous else 1
+    elif args.jobs < 1:
+        parser.error('--jobs must be at least 1, received {}'.format(args.jobs))
+
+    if args.window < 1:
+        parser.error('--window must be at least 1, received {}'
+                     .format(args.window))
+
+    if args.all is not None and args.all < 1:
+        parser.error('--all must be at least 1, received {}'.format(args.all))
+
+    if args.last is not None and args.last < 1:
+        parser.error('--last must be at least 1, received {}'.format(args.last))
+
+    try:
+        since = parseTime(args.since, not args.localtime) \
+            if args.since else None
+        until = parseTime(args.until, not args.localtime) \
+            if args.until else None
+    except ValueError as err:
+        parser.error(str(err))
+
+    if args.since_last_run and args.all is not None:
+        parser.error('--since-last-run cannot be used with --all')
+
+    if args.top is not None:
+        if args.all is None:
+            parser.error('--top requires --all')
+        elif args.top < 1:
+            parser.error('--top must be at least 1, received {}'
+                         .format(args.top))
+
+    if args.format != 'table':
+        for flag, given in (('--async', args.asynchronous),
+                            ('--all', args.all is not None),
+                            ('--forecast', args.forecast),
+                            ('--serve', args.serve is not None)):
+            if given:
+                parser.error('--format {} cannot be used with {}'
+                             .format(args.format, flag))
+
+    if args.collapse:
+        for flag, given in (('--format', args.format != 'table'),
+                            ('--all', args.all is not None),
+                            ('--forecast', args.forecast),
+                            ('--serve', args.serve is not None)):
+            if given:
+                parser.error('--collapse cannot be used with {}'.format(flag))
+
+    if args.store:
+        for flag, given in (('--async', args.asynchronous),
+                            ('--stream', args.stream),
+                            ('--all', args.all is not None),
+                            ('--serve', args.serve is not None),
+                            ('--since-last-run', args.since_last_run)):
+            if given:
+                parser.error('--store cannot be used with {}'.format(flag))
+    elif args.query:
+        parser.error('--query requires --store')
+
+    presentation = dict(binary=args.metric,
+                        noscale=args.noscale,
+                        color=args.color,
+                        localtime=args.localtime)
+
+    if args.serve:
+        if args.lru < 1:
+            parser.error('--lru must be at least 1, received {}'
+                         .format(args.lru))
+        VolumeServer(args.lru, cache=args.cache, jobs=args.jobs) \
+            .serve(args.serve)
+        return
+
+    if args.query:
+        with VolumeStore(args.store) as store:
+            uuids = args.agent or store.agents()
+            with timings.phase('query'):
+                allSnaps = [store.history(uuid, since, until, args.last,
+                                          args.collapse)
+                            for uuid in uuids]
+        show(args, uuids, allSnaps, presentation)
+        return
+
+    # One `zfs list` for every agent and snapshot, shared from here on.
+    with timings.phase('zfs list'):
+        index = ZFSIndex.load()
+    agents = index.agents
+
+    # Narrow the snapshots down before anything is read.
+    if since is not None or until is not None or args.last is not None:
+        index = index.between(since, until, args.last)
+
+    if args.all is not None:
+        with timings.phase('getInfo'):
+            summary = summarizeAgents(agents, index, count=args.all,
+                                      cache=args.cache, jobs=args.jobs)
+            # Rows are produced an agent at a time, so with --top only K of
+            # them are ever held at once.
+            if args.top:
+                rows = nlargest(args.top, summary, key=lambda row: row[0])
             else:
-                for id in args.agent:
-                    if id not in agents:
-                        with Color.red(), Color.bold():
-                            print('\n** ERROR: Please make a valid selection\n')
-                        break
-                allSnaps = getInfo(list(args.agent))
-                uuids = list(args.agent)
+                rows = sorted(summary, key=lambda row: row[0], reverse=True)
 
-    # allSnaps :: List[List[Dict[str, Dict[str, int]]]]
+        with timings.phase('render'):
+            PresentNiceColumns([], [], **presentation).renderSummary(rows)
+        return
 
-    PresentNiceColumns(allSnaps, uuids, binary=args.metric,
-                       noscale=args.noscale,
-                       color=args.color,
-                       localtime=args.localtime).render()
+    # Just some basic control-flow to get an agent that actually exists.
+    if not agents:
+        raise InvalidAgentNumberError('No agents found: {}'.format(agents))
+    else:
+        if not args.agent:
+            # List agents by UUID, ask the user for input.
+            while True:
+                print(*agents, sep='\n', end='\n\n')
+                uuid = input('Agent: ')
+                if uuid in agents:
+                    break
+                else:
+                    with Color.red(), Color.bold():
+                        print('\n** ERROR: Please make a valid selection, '
+                              'received \'{}\'\n'.format(uuid))
+            uuids = [uuid]
+        else:
+            for id in args.agent:
+                if id not in agents:
+                    with Color.red(), Color.bold():
+                        print('\n** ERROR: Please make a valid selection\n')
+                    break
+            uuids = list(args.agent)
+
+    if args.since_last_run:
+        watermarks = {uuid: Watermark(uuid) for uuid in uuids}
+        index = index.after({uuid: watermark.load()
+                             for uuid, watermark in watermarks.items()})
+
+        # Nothing new isn't worth a complaint.
+        uuids = [uuid for uuid in uuids if index.snapshots.get(uuid)]
+
+    if args.store:
+        with VolumeStore(args.store) as store:
+            with timings.phase('store'):
+                storeAgents(uuids, index, store, cache=args.cache,
+                            jobs=args.jobs)
+            with timings.phase('query'):
+                allSnaps = [store.history(uuid, since, until, args.last,
+                                          args.collapse)
+                            for uuid in uuids]
+        show(args, uuids, allSnaps, presentation)
+        return
+
+    present(args, uuids, index, presentation)
+
+    if args.since_last_run:
+        # Only now that everything new has been written out. Snapshots that
+        # failed to parse (already reported) are passed over too: they're
+        # immutable, so they'd only fail the same way next time.
+        for uuid in uuids:
+            watermarks[uuid].advance(index.snapshots[uuid][-1][1])
+
+
+def present(args: argparse.Namespace, uuids: List[str], index: ZFSIndex,
+            presentation: Dict[str, Any]) -> None:
+    """
+    Ingest and print the selected agents' snapshots in whichever mode `args`
+    asks for.
+    """
+    if args.format != 'table':
+        records = PresentRecords(args.format)
+        pool = ProcessPoolExecutor(max_workers=args.jobs) \
+            if args.jobs > 1 else None
+        try:
+            with timings.phase('getInfo + render'):
+                for uuid in uuids:
+                    with SnapshotCache(uuid, enabled=args.cache,
+                                       rebuild=args.rebuild_cache) as cached:
+                        snapshots = index.snapshots.get(uuid, [])
+                        if not index.partial:
+                            cached.retain([snap for snap, _ in snapshots])
+                        records.write(uuid, streamInfo(
+                            uuid, index, pool, batch=args.window,
+                            cached=cached
+                        ))
+        finally:
+            if pool:
+                pool.shutdown()
+        return
+
+    if args.asynchronous:
+        with timings.phase('getInfo + render'):
+            asyncio.get_event_loop().run_until_complete(
+                presentAsync(uuids, index, args.jobs, cache=args.cache,
+                             rebuildCache=args.rebuild_cache,
+                             collapse=args.collapse, **presentation)
+            )
+        return
+
+    if args.stream:
+        presenter = PresentNiceColumns([], [], **presentation)
+        pool = ProcessPoolExecutor(max_workers=args.jobs) \
+            if args.jobs > 1 else None
+        try:
+            with timings.phase('getInfo + render'):
+                for uuid in uuids:
+                    presenter.renderStream(
+                        uuid, streamInfo(uuid, index, pool, batch=args.window),
+                        window=args.window, collapse=args.collapse
+                    )
+        finally:
+            if pool:
+                pool.shutdown()
+        return
+
+    with timings.phase('getInfo'):
+        allSnaps = getInfo(uuids, index, cache=args.cache,
+                           rebuildCache=args.rebuild_cache, jobs=args.jobs,
+                           collapse=args.collapse)
+
+    # allSnaps :: List[VolumeHistory]
+
+    show(args, uuids, allSnaps, presentation)
+
+
+def show(args: argparse.Namespace, uuids: List[str],
+         allSnaps: List[VolumeHistory], presentation: Dict[str, Any]) -> None:
+    """
+    Print agents' tables, records or `--forecast`.
+    """
+    if args.format != 'table':
+        with timings.phase('render'):
+            records = PresentRecords(args.format)
+            for uuid, history in zip(uuids, allSnaps):
+                records.write(uuid, history)
+        return
+
+    if args.forecast:
+        with timings.phase('forecast'):
+            # Soonest full first; those that aren't filling up, last.
+            rows = sorted(forecast(uuids, allSnaps), key=lambda row:
+                          (row[0] is None, row[0] or 0, -row[6]))
+        with timings.phase('render'):
+            PresentNiceColumns([], [], **presentation).renderForecast(rows)
+        return
+
+    with timings.phase('render'):
+        PresentNiceColumns(allSnaps, uuids, **presentation).render()
 
 
 if __name__ == '__main__':
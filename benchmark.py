@@ -0,0 +1,415 @@
+#! /usr/bin/env python3.5
+# -*- coding: utf-8 -*-
+
+"""
+    Time basicVolumeInfo.py's hot paths against a synthetic agent tree.
+
+    Generates serialized agentInfo files for Linux and Windows agents under a
+    fake `<root>/agents/<uuid>/.zfs/snapshot/<epoch>/` tree, puts a stub `zfs`
+    on PATH that lists it, and times each stage at several scales, e.g.
+
+        $ ./benchmark.py --scales 10 1000 10000 -o before.json
+        $ ./benchmark.py --scales 10 1000 10000 -o after.json --compare before.json
+
+    Every stage is run once for time and once more under `tracemalloc` for its
+    peak memory, and reported on stdout and, with `-o`, as JSON.
+"""
+
+
+from typing import List, Dict, Optional, Any, Callable, Tuple
+from random import Random
+from io import StringIO
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import basicVolumeInfo as bvi
+
+
+def serialize(value: Any) -> str:
+    """
+    Map Python values -> serialized agentInfo, i.e. PHP's `serialize`.
+    """
+    if isinstance(value, bool):
+        return 'b:{:d};'.format(value)
+    elif isinstance(value, int):
+        return 'i:{:d};'.format(value)
+    elif isinstance(value, float):
+        return 'd:{!r};'.format(value)
+    elif value is None:
+        return 'N;'
+    elif isinstance(value, str):
+        return 's:{:d}:"{}";'.format(len(value.encode()), value)
+    elif isinstance(value, dict):
+        return 'a:{:d}:{{{}}}'.format(len(value), ''.join(
+            serialize(key) + serialize(item) for key, item in value.items()
+        ))
+    else:
+        raise TypeError('Cannot serialize {}'.format(type(value)))
+
+
+class AgentGenerator:
+    """
+    Realistic-looking agentInfo dictionaries, with `volumes` data volumes (plus
+    the system volumes the script filters out) and `inventory` installed
+    packages (Linux) or drivers (Windows), which are the bulk of a real file.
+    Used bytes grow from one snapshot to the next.
+    """
+    def __init__(self, volumes: int =4, inventory: int =200,
+                       seed: int =0) -> None:
+        self.volumes = volumes
+        self.inventory = inventory
+        self.seed = seed
+
+    def used(self, snapshot: int, volume: int) -> int:
+        random = Random(self.seed * 7919 + volume)
+        return random.randrange(2 ** 38) + snapshot * random.randrange(2 ** 26)
+
+    def linux(self, snapshot: int) -> Dict:
+        volumes = {
+            '<swap>': {'mountpoint': '<swap>', 'capacity': 2 ** 33,
+                       'used': 0, 'filesystem': 'swap'}
+        }  # type: Dict[str, Any]
+
+        for volume in range(self.volumes):
+            volumes['/mnt/data{}'.format(volume)] = {
+                'mountpoint': '/mnt/data{}'.format(volume),
+                'capacity': 2 ** 41,
+                'used': self.used(snapshot, volume),
+                'filesystem': 'ext4',
+                'guid': '{:032x}'.format(Random(volume).getrandbits(128)),
+                'mounted': True,
+            }
+
+        return {
+            'hostname': 'linux-{}'.format(self.seed),
+            'type': 'linux',
+            'os': 'Ubuntu 16.04.5 LTS',
+            'kernel': '4.4.0-141-generic',
+            'Volumes': volumes,
+            'packages': {
+                package: {'name': 'package{}'.format(package),
+                          'version': '1.{}.{}'.format(package, snapshot),
+                          'size': package * 1.5, 'installed': True}
+                for package in range(self.inventory)
+            },
+        }
+
+    def windows(self, snapshot: int) -> Dict:
+        volumes = {
+            'BOOT': {'capacity': '524288000', 'used': 2 ** 25},
+            'System Reserved': {'capacity': '104857600', 'used': 2 ** 24},
+        }  # type: Dict[str, Any]
+
+        for volume in range(self.volumes):
+            letter = chr(ord('C') + volume)
+            volumes[letter] = {
+                'mountpoint': letter + ':\\',
+                'capacity': str(2 ** 41),
+                'used': self.used(snapshot, volume),
+                'filesystem': 'NTFS',
+                'serialNumber': '{:08X}'.format(Random(volume).getrandbits(32)),
+            }
+
+        return {
+            'hostname': 'WIN-{}'.format(self.seed),
+            'os': 'Windows 2012 R2',
+            'Volumes': volumes,
+            'drivers': {
+                driver: {'name': 'driver{}.sys'.format(driver),
+                         'version': '6.3.{}.{}'.format(driver, snapshot),
+                         'signed': True}
+                for driver in range(self.inventory)
+            },
+        }
+
+
+class FakeTree:
+    """
+    A temporary agent tree with `snapshots` snapshots spread across
+    `agents` agents (alternately Linux and Windows), and a stub `zfs` that
+    lists them. While in use, basicVolumeInfo looks here rather than at
+    /home/agents, and caches under the tree as well. A kept `root` from an
+    earlier run is written over, and its cache cleared.
+    """
+    def __init__(self, snapshots: int, agents: int =2,
+                       generator: Optional[AgentGenerator] =None,
+                       root: Optional[str] =None) -> None:
+        self.snapshots = snapshots
+        self.agents = agents
+        self.generator = generator or AgentGenerator()
+        self.root = root
+        self.created = root is None
+        self.uuids = ['{:032x}'.format(agent) for agent in range(agents)]
+        self.bytes = 0
+        self.files = []  # type: List[str]
+        self.saved = ('', '', '')  # type: Tuple[str, str, str]
+
+    def build(self) -> None:
+        if self.root is None:
+            self.root = tempfile.mkdtemp(prefix='basicVolumeInfo-bench-')
+
+        mountpoint = os.path.join(self.root, 'agents') + '/'
+        listing = []  # type: List[str]
+
+        for agent, uuid in enumerate(self.uuids):
+            dataset = bvi.agentDataset + '/' + uuid
+            listing.append('{}\t{}'.format(dataset, 1500000000))
+
+            # The first agents take any remainder.
+            count = self.snapshots // self.agents \
+                + (agent < self.snapshots % self.agents)
+            kind = self.generator.linux if agent % 2 == 0 \
+                else self.generator.windows
+
+            for snapshot in range(count):
+                epoch = str(1500000000 + snapshot * 3600)
+                directory = mountpoint + uuid + '/.zfs/snapshot/' + epoch
+                os.makedirs(directory, exist_ok=True)
+
+                path = os.path.join(directory, uuid + '.agentInfo')
+                data = serialize(kind(snapshot)).encode()
+                with open(path, 'wb') as agentInfo:
+                    agentInfo.write(data)
+
+                self.bytes += len(data)
+                self.files.append(path)
+                listing.append('{}@{}\t{}'.format(dataset, epoch, epoch))
+
+        binaries = os.path.join(self.root, 'bin')
+        os.makedirs(binaries, exist_ok=True)
+
+        with open(os.path.join(binaries, 'zfs.list'), 'w') as zfsList:
+            zfsList.write('\n'.join(listing) + '\n')
+
+        # The listing is fixed, so the stub ignores its arguments.
+        stub = os.path.join(binaries, 'zfs')
+        with open(stub, 'w') as zfs:
+            zfs.write('#! {}\nimport sys\n'
+                      'sys.stdout.write(open({!r}).read())\n'.format(
+                          sys.executable, os.path.join(binaries, 'zfs.list')
+                      ))
+        os.chmod(stub, 0o755)
+
+        self.saved = (bvi.agentMountpoint, bvi.cacheDirectory,
+                      os.environ.get('PATH', ''))
+        bvi.agentMountpoint = mountpoint
+        bvi.cacheDirectory = os.path.join(self.root, 'cache')
+        os.environ['PATH'] = binaries + os.pathsep + self.saved[2]
+        self.clearCache()
+
+    def clearCache(self) -> None:
+        shutil.rmtree(bvi.cacheDirectory, ignore_errors=True)
+
+    def __enter__(self) -> 'FakeTree':
+        self.build()
+        return self
+
+    def __exit__(self, *args: Any) -> Any:
+        bvi.agentMountpoint, bvi.cacheDirectory, os.environ['PATH'] = \
+            self.saved
+        if self.created:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+def measure(stage: Callable[[], Any], items: int, nbytes: int =0,
+            setup: Optional[Callable[[], Any]] =None) -> Dict[str, Any]:
+    """
+    Run `stage` (after `setup`, each time) once for wall and CPU time, then
+    again under `tracemalloc` for the peak memory it allocates.
+    """
+    if setup:
+        setup()
+    wall, cpu = time.perf_counter(), time.process_time()
+    stage()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        stage()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        'seconds': wall,
+        'cpuSeconds': cpu,
+        'items': items,
+        'itemsPerSecond': items / wall if wall else None,
+        'peakBytes': peak,
+    }  # type: Dict[str, Any]
+
+    if nbytes:
+        result['bytes'] = nbytes
+        result['bytesPerSecond'] = nbytes / wall if wall else None
+
+    return result
+
+
+def benchmark(tree: FakeTree, jobs: int =1) -> Dict[str, Dict[str, Any]]:
+    """
+    Time every stage against `tree`.
+    """
+    results = {}  # type: Dict[str, Dict[str, Any]]
+    files = tree.files
+
+    def decode(select: Optional[List[Any]] =None) -> List[Dict]:
+        return [bvi.ConvertJSON(path, select=select).decode()
+                for path in files]
+
+    results['decode'] = measure(decode, len(files), tree.bytes)
+    results['decodeSelect'] = measure(
+        lambda: decode(bvi.agentInfoFields), len(files), tree.bytes
+    )
+    results['decodeLazy'] = measure(
+        lambda: [bvi.ConvertJSON(path, lazy=True).decode()['os']
+                 for path in files],
+        len(files), tree.bytes
+    )
+
+    infos = decode()
+
+    def project() -> List[Dict]:
+        return [bvi.linux(info) if info.get('type') == 'linux'
+                else bvi.windows(info) for info in infos]
+
+    results['projection'] = measure(project, len(infos))
+    del infos
+
+    results['zfsIndex'] = measure(bvi.ZFSIndex.load, len(files))
+    index = bvi.ZFSIndex.load()
+
+    def getInfo(**kwargs: Any) -> List[bvi.VolumeHistory]:
+        return bvi.getInfo(tree.uuids, index, jobs=jobs, **kwargs)
+
+    results['getInfo'] = measure(lambda: getInfo(cache=False), len(files))
+    results['getInfoColdCache'] = measure(getInfo, len(files),
+                                          setup=tree.clearCache)
+    getInfo()
+    results['getInfoWarmCache'] = measure(getInfo, len(files))
+
+    allSnaps = getInfo()
+
+    def render() -> str:
+        out = StringIO()
+        bvi.PresentNiceColumns(allSnaps, tree.uuids, color=False,
+                               out=out).render()
+        return out.getvalue()
+
+    results['render'] = measure(render, len(files))
+
+    present = bvi.PresentNiceColumns(allSnaps, tree.uuids)
+    used = [column for history in allSnaps for column in history.used]
+    values = sum(map(len, used))
+
+    results['scaleColumn'] = measure(
+        lambda: [present.scaleColumn(column) for column in used], values
+    )
+    results['scale'] = measure(
+        lambda: [present.scale(value) for column in used for value in column],
+        values
+    )
+
+    return results
+
+
+def report(scale: int, results: Dict[str, Dict[str, Any]],
+           baseline: Optional[Dict[str, Dict[str, Any]]] =None) -> None:
+    """
+    Print one scale's results, against those of a previous run if given.
+    """
+    print('{} snapshots'.format(scale))
+
+    for stage, result in results.items():
+        line = '  {:<18} {:>10.4f}s {:>12.0f}/s {:>10.1f}KiB'.format(
+            stage, result['seconds'], result['itemsPerSecond'] or 0,
+            result['peakBytes'] / 1024
+        )
+
+        if baseline and stage in baseline and result['seconds']:
+            line += '  {:>6.2f}x'.format(
+                baseline[stage]['seconds'] / result['seconds']
+            )
+
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+
+    parser.add_argument('-s', '--scales', type=int, nargs='+',
+        default=[10, 1000, 10000],
+        help='Total snapshots to generate, per run.'
+    )
+    parser.add_argument('-a', '--agents', type=int, default=2,
+        help='Agents to spread snapshots across, alternately Linux and Windows.'
+    )
+    parser.add_argument('-v', '--volumes', type=int, default=4,
+        help='Data volumes per agent.'
+    )
+    parser.add_argument('-i', '--inventory', type=int, default=200,
+        help='Packages or drivers listed per agentInfo file.'
+    )
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+        help='Worker processes for `getInfo`.'
+    )
+    parser.add_argument('-d', '--directory', type=str,
+        help='Build trees here (and keep them) instead of in a temporary '
+             'directory.'
+    )
+    parser.add_argument('-o', '--output', type=str,
+        help='Save results as JSON.'
+    )
+    parser.add_argument('--compare', type=str,
+        help='Show speedups over the results saved in this JSON file.'
+    )
+
+    args = parser.parse_args()
+
+    baseline = {}  # type: Dict[str, Dict[str, Dict[str, Any]]]
+    if args.compare:
+        with open(args.compare) as previous:
+            baseline = json.load(previous)['scales']
+
+    runs = {}  # type: Dict[str, Dict[str, Dict[str, Any]]]
+
+    for scale in args.scales:
+        generator = AgentGenerator(args.volumes, args.inventory)
+        root = os.path.join(args.directory, str(scale)) \
+            if args.directory else None
+
+        with FakeTree(scale, args.agents, generator, root) as tree:
+            runs[str(scale)] = benchmark(tree, args.jobs)
+
+        report(scale, runs[str(scale)], baseline.get(str(scale)))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'finished': time.time(),
+                'parameters': {
+                    'agents': args.agents,
+                    'volumes': args.volumes,
+                    'inventory': args.inventory,
+                    'jobs': args.jobs,
+                },
+                'maxRSSKiB': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                'scales': runs,
+            }, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()